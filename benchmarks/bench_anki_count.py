@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Anki単語の漢検漢字カウントのベンチマーク。
+
+HTMLやふりがなを含む疑似デッキ（デフォルト5万語）に対して、従来の単語ごとの
+集合演算による実装（マークアップ除去なし・単語ごとに除去）と KanjiUtils.count_kanji_in_words を比較する。
+
+    python benchmarks/bench_anki_count.py [--words 50000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from corpus import make_anki_deck  # noqa: E402
+from kankensub import KanjiUtils  # noqa: E402
+
+
+def make_deck(words, seed=0):
+    # AnkiHandler.get_words_in_deck と同じく、単語の末尾に改行を付ける
+    return [word + '\n' for word in make_anki_deck(words, seed)]
+
+
+def legacy_count(anki_words, kanken_j1k_set, kanken_j1k1k_set, kanken_1k_set, strip_markup=False):
+    kanji_occurrences = {kanji: 0 for kanji in kanken_j1k_set | kanken_j1k1k_set | kanken_1k_set}
+    for word in anki_words:
+        if strip_markup:
+            word = KanjiUtils.ANKI_MARKUP_RE.sub('', word)
+        unique_kanji_in_word = set(word) & kanji_occurrences.keys()
+        for kanji in unique_kanji_in_word:
+            kanji_occurrences[kanji] += 1
+    return {k: v for k, v in kanji_occurrences.items() if v > 0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Anki単語カウントのベンチマーク")
+    parser.add_argument("--words", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    deck = make_deck(args.words)
+    # 従来の実装は毎回セットを作り直していたので、その分も計測に含める
+    legacy_sets = lambda: (set(KanjiUtils.kanken_kanji_data['j1k']), set(KanjiUtils.kanken_kanji_data['j1k1k']), set(KanjiUtils.kanken_kanji_data['1k']))  # noqa: E731
+
+    assert legacy_count(deck, *legacy_sets(), strip_markup=True) == KanjiUtils.count_kanji_in_words(deck, *KanjiUtils.load_kanken_kanji_sets())
+
+    legacy = min(timeit.repeat(lambda: legacy_count(deck, *legacy_sets()), number=1, repeat=args.repeat))
+    legacy_stripped = min(timeit.repeat(lambda: legacy_count(deck, *legacy_sets(), strip_markup=True), number=1, repeat=args.repeat))
+    current = min(timeit.repeat(lambda: KanjiUtils.count_kanji_in_words(deck, *KanjiUtils.load_kanken_kanji_sets()), number=1, repeat=args.repeat))
+
+    coverage = KanjiUtils.coverage_by_level(KanjiUtils.count_kanji_in_words(deck, *KanjiUtils.load_kanken_kanji_sets()))
+    print(f"words: {args.words:,}")
+    print(f"legacy (no markup stripping)      : {legacy * 1000:.1f} ms")
+    print(f"legacy + per-word markup stripping: {legacy_stripped * 1000:.1f} ms")
+    print(f"single pass (frozenset index)     : {current * 1000:.1f} ms")
+    print(f"speedup vs. stripped legacy: {legacy_stripped / current:.1f}x")
+    print("coverage: " + ", ".join(f"{KanjiUtils.LEVEL_NAMES[level]} {len(kanji)}/{total}" for level, (kanji, total) in coverage.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+漢字判定のマイクロベンチマーク。
+
+従来の「IS_NOT_JAPANESE_PATTERN + unicodedata.name による is_kanji」と、
+コードポイント表による str.translate の1パス抽出を比較する。
+
+    python benchmarks/bench_classify.py [--lines 200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import regex as re  # noqa: E402
+
+from kankensub import KanjiUtils  # noqa: E402
+
+BASE_TEXT = "今日はいい天気ですね。明日も晴れるといいな！ Hello 123 {\\an8}ｶﾀｶﾅ、ひらがな、漢字混じりの台詞"
+KANKEN_SET = set().union(*KanjiUtils.load_kanken_kanji_sets())
+
+
+def make_lines(count, seed=0):
+    # 漢検漢字を少し混ぜた疑似字幕行を生成する
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    lines = []
+    for _ in range(count):
+        chars = list(BASE_TEXT)
+        for _ in range(rng.randint(0, 3)):
+            chars.insert(rng.randrange(len(chars)), rng.choice(kanken))
+        lines.append("".join(chars))
+    return lines
+
+
+def legacy_scan(lines):
+    hits = 0
+    for text in lines:
+        cleaned_text = re.sub(KanjiUtils.IS_NOT_JAPANESE_PATTERN, '', text)
+        for kanji in filter(KanjiUtils.is_kanji, cleaned_text):
+            if kanji in KANKEN_SET:
+                hits += 1
+    return hits
+
+
+def table_scan(lines):
+    hits = 0
+    for text in lines:
+        hits += len(KanjiUtils.extract_kanken_kanji(text))
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="漢字判定のマイクロベンチマーク")
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = make_lines(args.lines)
+    assert legacy_scan(lines[:1000]) == table_scan(lines[:1000])
+
+    legacy = min(timeit.repeat(lambda: legacy_scan(lines), number=1, repeat=args.repeat))
+    table = min(timeit.repeat(lambda: table_scan(lines), number=1, repeat=args.repeat))
+
+    print(f"lines: {args.lines}")
+    print(f"legacy (regex + unicodedata.name): {legacy:.3f}s ({args.lines / legacy:,.0f} lines/s)")
+    print(f"table  (str.translate)           : {table:.3f}s ({args.lines / table:,.0f} lines/s)")
+    print(f"speedup: {legacy / table:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+ファイル探索のベンチマーク。
+
+シリーズごとのディレクトリに字幕と無関係なファイルを混ぜたツリーを作り、
+従来の os.walk + 全件ソートと、FileUtils.iter_files（並行 os.scandir）の
+最初のファイルが見つかるまでの時間と全件の探索時間を比較する。
+--latency を指定すると、ディレクトリを読むたびに待ち時間を入れてネットワークドライブを模擬する。
+
+    python benchmarks/bench_discovery.py [--dirs 500] [--files-per-dir 40] [--latency 0.002]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kankensub import FileUtils, KanjiUtils  # noqa: E402
+
+EXTENSIONS = ['.srt', '.ass', '.vtt']
+
+
+def make_tree(directory, dirs, files_per_dir):
+    for series in range(dirs):
+        season_dir = os.path.join(directory, f"Show {series:04d}", "Season 1")
+        os.makedirs(season_dir)
+        for episode in range(files_per_dir):
+            extension = ('.srt', '.ass', '.vtt', '.mkv', '.nfo')[episode % 5]
+            open(os.path.join(season_dir, f"Show.{series:04d}.第{episode + 1}話{extension}"), 'w').close()
+
+
+def legacy_get_files(target, extensions):
+    files = []
+    for root, _, filenames in os.walk(target):
+        for filename in filenames:
+            if any(filename.endswith(ext) for ext in extensions):
+                files.append(os.path.join(root, filename))
+    files.sort(key=lambda f: (KanjiUtils.extract_number_from_kanji(os.path.basename(f)), os.path.basename(f)))
+    return files
+
+
+def timed(discover):
+    # (最初の要素までの時間, 全件の時間, 件数) を返す
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in discover():
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    return first or 0.0, time.perf_counter() - start, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ファイル探索のベンチマーク")
+    parser.add_argument("--dirs", type=int, default=500)
+    parser.add_argument("--files-per-dir", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.0, help='ディレクトリを読むごとの待ち時間（秒）')
+    args = parser.parse_args()
+
+    if args.latency:
+        # os.scandir を遅くして、ネットワークドライブのディレクトリ読み込みを模擬する
+        scandir = os.scandir
+
+        def slow_scandir(path='.'):
+            time.sleep(args.latency)
+            return scandir(path)
+        os.scandir = slow_scandir
+
+    with tempfile.TemporaryDirectory() as directory:
+        make_tree(directory, args.dirs, args.files_per_dir)
+        results = {
+            'os.walk + sort': timed(lambda: legacy_get_files(directory, EXTENSIONS)),
+            'iter_files': timed(lambda: FileUtils.iter_files(directory, EXTENSIONS)),
+            'get_files (sorted)': timed(lambda: FileUtils.get_files(directory, EXTENSIONS)),
+        }
+
+    for name, (first, total, count) in results.items():
+        print(f"{name:20s}: first file {first * 1000:8.1f} ms, all {count:,} files {total * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+出現箇所ストアのメモリベンチマーク。
+
+従来の kanji_timestamps（漢字ごとの (ファイル, 開始時刻, テキスト) リスト）と
+OccurrenceStore のメモリ使用量・pickleサイズ（ワーカーからの転送量）を比較する。
+
+    python benchmarks/bench_memory.py [--files 500] [--lines 400]
+"""
+
+import argparse
+import os
+import pickle
+import random
+import sys
+import tracemalloc
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from corpus import make_line  # noqa: E402
+from kankensub import KanjiUtils, OccurrenceStore  # noqa: E402
+
+
+def iter_lines(files, lines_per_file, seed=0):
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    for index in range(files):
+        # 実際のパスと同じように長めのファイル名にする
+        file = f"/media/library/Synthetic Show/Season 01/[Group] Synthetic.Show.S01E{index + 1:03d}.1080p.WEBRip.ja.srt"
+        for line in range(lines_per_file):
+            yield file, line * 3000, make_line(rng, kanken)
+
+
+def build_legacy(lines):
+    kanji_timestamps = defaultdict(list)
+    for file, start_time, text in lines:
+        for kanji in KanjiUtils.extract_kanken_kanji(text):
+            kanji_timestamps[kanji].append((file, start_time, text))
+    return kanji_timestamps
+
+
+def build_store(lines, max_examples):
+    store = OccurrenceStore(max_examples)
+    for file, start_time, text in lines:
+        kanji_chars = KanjiUtils.extract_kanken_kanji(text)
+        if kanji_chars:
+            store.add_line(file, start_time, text, kanji_chars)
+    return store
+
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出現箇所ストアのメモリベンチマーク")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=400)
+    parser.add_argument("--max-examples", type=int, default=10)
+    args = parser.parse_args()
+
+    # 行テキストはどちらの構造でも共有されるため、生成済みのリストを使って構造自体の差だけを測る
+    lines = list(iter_lines(args.files, args.lines))
+    KanjiUtils.load_kanken_scan_table()
+
+    legacy, legacy_bytes = measure(lambda: build_legacy(lines))
+    store, store_bytes = measure(lambda: build_store(lines, args.max_examples))
+    assert legacy.keys() == store.counts.keys()
+    assert all(len(legacy[kanji]) == store.count(kanji) for kanji in legacy)
+
+    legacy_pickle = len(pickle.dumps(dict(legacy), protocol=pickle.HIGHEST_PROTOCOL))
+    store_pickle = len(pickle.dumps(store, protocol=pickle.HIGHEST_PROTOCOL))
+
+    print(f"occurrences: {sum(store.counts.values()):,} ({len(store)} kanji)")
+    print(f"legacy kanji_timestamps: {legacy_bytes / 2**20:8.2f} MiB in memory, {legacy_pickle / 2**20:8.2f} MiB pickled")
+    print(f"OccurrenceStore        : {store_bytes / 2**20:8.2f} MiB in memory, {store_pickle / 2**20:8.2f} MiB pickled")
+    print(f"reduction: {legacy_bytes / store_bytes:.1f}x memory, {legacy_pickle / store_pickle:.1f}x pickle")
+
+
+if __name__ == "__main__":
+    main()
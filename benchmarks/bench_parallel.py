@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+並列スキャンのスケーリングベンチマーク。
+
+疑似コーパスに対して process_subtitle_files を 1〜N プロセスで実行し、処理時間を比較する。
+
+    python benchmarks/bench_parallel.py [--files 400] [--lines 400] [--max-jobs 8]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from corpus import generate_srt_corpus  # noqa: E402
+from kankensub import KanjiUtils, KankenSubtitleProcessor  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="並列スキャンのスケーリングベンチマーク")
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--lines", type=int, default=400)
+    parser.add_argument("--max-jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    kanken_sets = KanjiUtils.load_kanken_kanji_sets()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = generate_srt_corpus(directory, files=args.files, lines_per_file=args.lines)
+        total_lines = args.files * args.lines
+
+        jobs_list = sorted({1, *[2 ** i for i in range(1, args.max_jobs.bit_length())], args.max_jobs})
+        baseline = None
+        for jobs in jobs_list:
+            processor = KankenSubtitleProcessor(*kanken_sets, {})
+            start = time.perf_counter()
+            processor.process_subtitle_files(files, max_workers=jobs)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"jobs={jobs:2d}: {elapsed:.3f}s ({args.files / elapsed:,.0f} files/s, "
+                  f"{total_lines / elapsed:,.0f} lines/s) speedup {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+PDF出力のベンチマーク。
+
+100・1,000・3,000字の要約について、1つのPDFにまとめる場合と、レベル別に分割して
+1プロセス・複数プロセスで作成する場合の時間を比較する。
+NotoSansJPフォントが見つからない場合は ReportLab 付属の Vera.ttf で代用する
+（日本語のグリフが無いため、埋め込みの分だけ実際より速く出る）。
+ReportLabのC拡張（rl_accel）が無い環境では文字幅の計算が純Pythonになるため、全体的に遅くなる。
+
+    python benchmarks/bench_pdf_export.py [--sizes 100 1000 3000] [--font PATH]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import kankensub  # noqa: E402
+from corpus import make_line  # noqa: E402
+from kankensub import FileUtils, KanjiUtils, KankenSubtitleProcessor  # noqa: E402
+
+
+def make_processor(kanji_count, examples=10, seed=0):
+    # kanji_count 字の漢検漢字それぞれに用例を持つプロセッサーを作る
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    processor = KankenSubtitleProcessor(*KanjiUtils.load_kanken_kanji_sets(), {}, export=True, max_examples=examples)
+    # レベル別の分割が効くよう、全レベルから選ぶ
+    for index, kanji in enumerate(rng.sample(kanken, kanji_count)):
+        for example in range(examples):
+            file = f"/library/[Group] Show {index % 20:02d}/[Group] Show.{index % 20:02d}.S01E{example + 1:02d}.1080p.WEBRip.ja.srt"
+            line = make_line(rng, kanken)
+            processor.occurrences.add_line(file, rng.randrange(0, 1440000), line + kanji, KanjiUtils.extract_kanken_kanji(line + kanji))
+    return processor
+
+
+def clear_memo():
+    FileUtils.display_filename.cache_clear()
+    FileUtils.series_name.cache_clear()
+    KankenSubtitleProcessor._format_timestamp.cache_clear()
+
+
+def timed_export(processor, export_path, pdf_split, jobs):
+    clear_memo()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        processor.print_kanji_summary(nbr_of_allowed_existing_cards=0, export_path=export_path, pdf_split=pdf_split, max_workers=jobs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF出力のベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[100, 1000, 3000])
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--font", type=str, default=None)
+    args = parser.parse_args()
+
+    font = args.font or kankensub.font_path
+    if not os.path.exists(font):
+        font = os.path.join(os.path.dirname(kankensub._lazy_import('reportlab').__file__), 'fonts', 'Vera.ttf')
+        print(f"NotoSansJPが見つからないため {font} を使用します。")
+    kankensub.register_pdf_font(font)
+
+    with tempfile.TemporaryDirectory() as directory:
+        export_path = os.path.join(directory, "kanji_summary.pdf")
+        for size in args.sizes:
+            processor = make_processor(size)
+            for pdf_split, jobs in (('none', 1), ('level', 1), ('level', args.jobs)):
+                elapsed = timed_export(processor, export_path, pdf_split, jobs)
+                print(f"{size:5d} kanji, split={pdf_split:5s}, jobs={jobs:2d}: {elapsed:.2f}s ({size / elapsed:,.0f} kanji/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+起動時間のベンチマーク。
+
+空のインタープリター（python -c pass）と kankensub の読み込み、および
+PDF出力で必要になる reportlab を含めた読み込みの時間を別プロセスで計測する。
+モジュールごとの内訳は `python -X importtime kankensub.py ...` や
+`kankensub.py --profile-startup` で確認できる。
+
+    python benchmarks/bench_startup.py [--runs 20]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CASES = [
+    ("bare interpreter", "pass"),
+    ("import kankensub", "import kankensub"),
+    ("import kankensub + reportlab (PDF)", "import kankensub; kankensub._lazy_import('reportlab.platypus')"),
+]
+
+
+def measure(code, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    for name, code in CASES:
+        print(f"{name:36s}: {measure(code, args.runs) * 1000:7.1f} ms (median of {args.runs})")
+
+
+if __name__ == "__main__":
+    main()
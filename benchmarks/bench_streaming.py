@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+ストリーミングスキャンのベンチマーク。
+
+pysubs2 を使う通常モードと、軽量トークナイザーを使うストリーミングモードの
+処理速度とピークRSSを、コーパスの規模を変えて比較する。
+ピークRSSを正しく測るため、各計測は別プロセスで実行する。
+
+    python benchmarks/bench_streaming.py [--files 100 400 1600] [--lines 400]
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from corpus import generate_srt_corpus  # noqa: E402
+
+
+def run_once(directory, stream):
+    # 子プロセス側: 1回スキャンして結果をJSONで出力する
+    from kankensub import FileUtils, KanjiUtils, KankenSubtitleProcessor
+
+    files = FileUtils.get_files(directory, ['.srt', '.ass'])
+    processor = KankenSubtitleProcessor(*KanjiUtils.load_kanken_kanji_sets(), {}, stream=stream)
+    start = time.perf_counter()
+    processor.process_subtitle_files(files, max_workers=1)
+    elapsed = time.perf_counter() - start
+    # Linuxでは KiB、macOSでは bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        max_rss *= 1024
+    print(json.dumps({'elapsed': elapsed, 'max_rss': max_rss, 'hits': sum(processor.occurrences.counts.values())}))
+
+
+def measure(directory, stream):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', directory] + (['--stream'] if stream else []),
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ストリーミングスキャンのベンチマーク")
+    parser.add_argument("--files", type=int, nargs='+', default=[100, 400, 1600])
+    parser.add_argument("--lines", type=int, default=400)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--stream", action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_once(args.child, args.stream)
+        return
+
+    for files in args.files:
+        with tempfile.TemporaryDirectory() as directory:
+            generate_srt_corpus(directory, files=files, lines_per_file=args.lines)
+            lines = files * args.lines
+            for stream in (False, True):
+                result = measure(directory, stream)
+                mode = "stream " if stream else "pysubs2"
+                print(f"{mode} files={files:5d}: {result['elapsed']:.3f}s ({lines / result['elapsed']:,.0f} lines/s), "
+                      f"peak RSS {result['max_rss'] / 2**20:.1f} MiB, hits {result['hits']:,}")
+
+
+if __name__ == "__main__":
+    main()
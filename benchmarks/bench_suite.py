@@ -0,0 +1,424 @@
+# -*- coding: utf-8 -*-
+"""
+抽出処理の各段階とエンドツーエンドをまとめて計測するベンチマークスイート。
+
+固定シードで .srt・.ass の疑似コーパス（ASSの上書きタグ・UTF-8/BOM付きの混在）を生成し、
+疑似AnkiConnectサーバー（fake_anki.py）を相手に次の段階を計測する。
+
+    parse            pysubs2 による字幕の読み込み
+    parse_stream     軽量トークナイザー（--stream）による字幕の読み込み
+    classify         漢検漢字の抽出
+    merge            バッチ結果の OccurrenceStore への統合
+    scan             process_subtitle_files 全体（--jobs のワーカーを使用）
+    anki_sync        Ankiからのノートの全件取得
+    anki_incremental キャッシュがある状態での差分同期
+    anki_count       Anki単語の漢検漢字カウント
+    summary          コンソールへの要約表示と進捗表示
+    pdf              PDF出力
+    end_to_end       kankensub.main() の実行（--stats-json の段階別の内訳も記録）
+
+ピークRSSを正しく測るため、各段階は別プロセスで実行する。結果はJSONで保存でき、
+--compare で以前の結果と比べて遅くなった段階を表示する（遅くなった段階があれば終了コード1）。
+ファイル数・行数・ノート数・シード・ジョブ数などの設定が以前の結果と異なる場合は比較せずに終了する（終了コード2。--force-compare で比較する）。
+
+    python benchmarks/bench_suite.py [--files 200] [--lines 400] [--notes 20000] [--output results.json]
+    python benchmarks/bench_suite.py --output new.json --compare old.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STAGES = ['parse', 'parse_stream', 'classify', 'merge', 'scan', 'anki_sync', 'anki_incremental', 'anki_count', 'summary', 'pdf', 'end_to_end']
+
+
+class StageSkipped(Exception):
+    # この環境では計測できない段階
+    pass
+
+
+def max_rss(who=resource.RUSAGE_SELF):
+    # Linuxでは KiB、macOSでは bytes
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def corpus_files(config):
+    from kankensub import FileUtils
+    return FileUtils.get_files(config['corpus'], ['.srt', '.ass'])
+
+
+def scanned_processor(config, export=False):
+    # コーパスをスキャン済みのプロセッサーを作る
+    from kankensub import KanjiUtils, KankenSubtitleProcessor
+    processor = KankenSubtitleProcessor(*KanjiUtils.load_kanken_kanji_sets(), {}, export=export)
+    processor.process_subtitle_files(corpus_files(config), max_workers=1)
+    return processor
+
+
+def clear_memo():
+    from kankensub import FileUtils, KankenSubtitleProcessor
+    FileUtils.display_filename.cache_clear()
+    FileUtils.series_name.cache_clear()
+    KankenSubtitleProcessor._format_timestamp.cache_clear()
+
+
+# 各段階: 準備（計測しない）をして、計測する処理 run を返す。run は処理量の辞書を返す
+
+def stage_parse(config):
+    from kankensub import KankenSubtitleProcessor
+    files = corpus_files(config)
+
+    def run():
+        lines = sum(len(KankenSubtitleProcessor._extract_text_and_timestamps(file)) for file in files)
+        return {'files': len(files), 'lines': lines, 'bytes': sum(os.path.getsize(file) for file in files)}
+    return run
+
+
+def stage_parse_stream(config):
+    from kankensub import SubtitleTokenizer
+    files = corpus_files(config)
+
+    def run():
+        lines = sum(sum(1 for _ in SubtitleTokenizer.iter_lines(file)) for file in files)
+        return {'files': len(files), 'lines': lines, 'bytes': sum(os.path.getsize(file) for file in files)}
+    return run
+
+
+def stage_classify(config):
+    from kankensub import KanjiUtils, KankenSubtitleProcessor
+    texts = [text for file in corpus_files(config) for text, _, _ in KankenSubtitleProcessor._extract_text_and_timestamps(file)]
+    KanjiUtils.load_kanken_scan_table()
+
+    def run():
+        hits = sum(len(KanjiUtils.extract_kanken_kanji(text)) for text in texts)
+        return {'lines': len(texts), 'kanji_hits': hits}
+    return run
+
+
+def stage_merge(config):
+    from kankensub import KankenSubtitleProcessor, OccurrenceStore
+    files = corpus_files(config)
+    batches = KankenSubtitleProcessor._make_batches(files, max(1, config['jobs']))
+    results = [KankenSubtitleProcessor._process_batch(batch)[0] for batch in batches]
+
+    def run():
+        store = OccurrenceStore()
+        for result in results:
+            store.merge(result)
+        return {'batches': len(results), 'lines': sum(len(texts) for texts in store.line_texts)}
+    return run
+
+
+def stage_scan(config):
+    import kankensub
+    files = corpus_files(config)
+    processor = kankensub.KankenSubtitleProcessor(*kankensub.KanjiUtils.load_kanken_kanji_sets(), {})
+
+    def run():
+        kankensub._run_stats.reset()
+        processor.process_subtitle_files(files, max_workers=config['jobs'])
+        counters = kankensub._run_stats.counters
+        return {'files': counters['files_scanned'], 'lines': counters['lines'], 'bytes': counters['bytes_read']}
+    return run
+
+
+def _anki_stage(config, incremental):
+    from fake_anki import FakeAnkiConnect
+    from kankensub import AnkiHandler
+    fake = FakeAnkiConnect(config['notes'], seed=config['seed']).start()
+    cache_file = os.path.join(config['workdir'], 'anki_cache.json')
+
+    def fetch():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return AnkiHandler(fake.url, cache_file=cache_file).get_words_in_deck('Bench', 'Word')
+
+    if incremental:
+        fetch()
+
+    def run():
+        if not incremental and os.path.exists(cache_file):
+            os.remove(cache_file)
+        requests = fake.requests
+        words = fetch()
+        return {'notes': len(words), 'requests': fake.requests - requests}
+    return run
+
+
+def stage_anki_sync(config):
+    return _anki_stage(config, incremental=False)
+
+
+def stage_anki_incremental(config):
+    return _anki_stage(config, incremental=True)
+
+
+def stage_anki_count(config):
+    from corpus import make_anki_deck
+    from kankensub import KanjiUtils
+    words = [word + '\n' for word in make_anki_deck(config['notes'], config['seed'])]
+    kanken_sets = KanjiUtils.load_kanken_kanji_sets()
+
+    def run():
+        KanjiUtils.count_kanji_in_words(words, *kanken_sets)
+        return {'words': len(words)}
+    return run
+
+
+def stage_summary(config):
+    processor = scanned_processor(config)
+
+    def run():
+        clear_memo()
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.print_kanji_summary(nbr_of_allowed_existing_cards=0)
+            processor.print_progress()
+        return {'kanji': len(processor.kanji_to_print(0))}
+    return run
+
+
+def stage_pdf(config):
+    import kankensub
+    font = config['font'] or kankensub.font_path
+    if not os.path.exists(font):
+        # NotoSansJPが無い環境では日本語のグリフが無い Vera.ttf で代用する（実際より速く出る）
+        font = os.path.join(os.path.dirname(kankensub._lazy_import('reportlab').__file__), 'fonts', 'Vera.ttf')
+    try:
+        kankensub.register_pdf_font(font)
+    except Exception as e:
+        raise StageSkipped(f"font could not be registered: {e}") from e
+    processor = scanned_processor(config, export=True)
+    export_path = os.path.join(config['workdir'], 'kanji_summary.pdf')
+
+    def run():
+        clear_memo()
+        with contextlib.redirect_stdout(io.StringIO()):
+            processor.print_kanji_summary(nbr_of_allowed_existing_cards=0, export_path=export_path, max_workers=config['jobs'])
+        return {'kanji': len(processor.kanji_to_print(0)), 'bytes': os.path.getsize(export_path)}
+    return run
+
+
+def stage_end_to_end(config):
+    import kankensub
+    from fake_anki import FakeAnkiConnect
+    fake = FakeAnkiConnect(config['notes'], seed=config['seed']).start()
+    # 設定・キャッシュがリポジトリに書き込まれないよう、作業ディレクトリに向ける
+    kankensub.FileUtils.SETTINGS_FILE = os.path.join(config['workdir'], 'settings.json')
+    kankensub.AnkiHandler.CACHE_FILE = os.path.join(config['workdir'], 'anki_cache.json')
+    stats_path = os.path.join(config['workdir'], 'stats.json')
+    argv = [
+        'kankensub.py', config['corpus'], '--deck', 'Bench', '--word', 'Word', '--anki-url', fake.url,
+        '--no-cache', '--stats-json', stats_path,
+    ] + (['-j', str(config['jobs'])] if config['jobs'] else [])
+
+    def run():
+        for path in (kankensub.FileUtils.SETTINGS_FILE, kankensub.AnkiHandler.CACHE_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+        kankensub._run_stats.reset()
+        sys.argv = argv
+        with contextlib.redirect_stdout(io.StringIO()):
+            kankensub.main()
+        with open(stats_path, encoding='utf-8') as f:
+            stats = json.load(f)
+        counters = stats['counters']
+        return {
+            'files': counters.get('files_scanned', 0), 'lines': counters.get('lines', 0), 'bytes': counters.get('bytes_read', 0),
+            'pipeline_stages': {name: stage['wall_sec'] for name, stage in stats['stages'].items()},
+        }
+    return run
+
+
+def run_child(stage, config):
+    # 子プロセス側: 1つの段階を準備して repeat 回計測し、結果をJSONで出力する
+    try:
+        run = globals()[f"stage_{stage}"](config)
+    except StageSkipped as e:
+        print(json.dumps({'skipped': str(e)}))
+        return
+    setup_rss = max_rss()
+
+    walls, cpus = [], []
+    units = {}
+    for _ in range(config['repeat']):
+        wall, cpu = time.perf_counter(), time.process_time()
+        units = run()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+
+    pipeline_stages = units.pop('pipeline_stages', None)
+    best = min(walls)
+    result = {
+        'wall_sec': {'min': best, 'median': statistics.median(walls), 'max': max(walls), 'runs': walls},
+        'cpu_sec': statistics.median(cpus),
+        'units': units,
+        'throughput': {f"{name}_per_sec": value / best if best > 0 else 0.0 for name, value in units.items()},
+        'setup_rss_bytes': setup_rss,
+        'peak_rss_bytes': max_rss(),
+        'children_peak_rss_bytes': max_rss(resource.RUSAGE_CHILDREN),
+    }
+    if pipeline_stages is not None:
+        result['pipeline_stages'] = pipeline_stages
+    print(json.dumps(result))
+
+
+def measure(stage, config):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', stage, '--config', json.dumps(config)],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else f"exit code {completed.returncode}"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def git_revision():
+    # 結果を比較できるよう、計測したコミットを記録する
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def print_results(results):
+    print(f"{'stage':<18}{'median (ms)':>12}{'min (ms)':>10}{'peak RSS (MiB)':>16}  throughput")
+    for stage, result in results.items():
+        if 'wall_sec' not in result:
+            print(f"{stage:<18}{'-':>12}{'-':>10}{'-':>16}  {result.get('skipped') or result.get('error')}")
+            continue
+        throughput = ", ".join(f"{value:,.0f} {name[:-len('_per_sec')]}/s" for name, value in result['throughput'].items())
+        print(
+            f"{stage:<18}{result['wall_sec']['median'] * 1000:>12.1f}{result['wall_sec']['min'] * 1000:>10.1f}"
+            f"{result['peak_rss_bytes'] / 2**20:>16.1f}  {throughput}"
+        )
+
+
+# 計測対象の量や条件を変える設定（これが違う結果どうしは比較できない）
+COMPARED_CONFIG_KEYS = ['files', 'lines', 'density', 'density_spread', 'formats', 'encodings', 'tag_rate', 'notes', 'seed', 'jobs', 'font']
+
+
+def config_mismatches(config, baseline):
+    # 以前の結果と設定が異なる項目を [(項目, 以前の値, 今回の値), ...] で返す
+    old_config = baseline.get('meta', {}).get('config', {})
+    return [(key, old_config.get(key), config.get(key)) for key in COMPARED_CONFIG_KEYS if old_config.get(key) != config.get(key)]
+
+
+def compare_results(results, baseline, threshold, out=sys.stdout):
+    # 以前の結果と比べて、遅くなった段階の数を返す
+    print(f"\ncompared with {baseline['meta'].get('commit') or 'baseline'} (threshold {threshold:.0%}):", file=out)
+    regressions = 0
+    for stage, result in results.items():
+        old = baseline['results'].get(stage, {})
+        if 'wall_sec' not in result or 'wall_sec' not in old:
+            continue
+        ratio = result['wall_sec']['median'] / old['wall_sec']['median'] if old['wall_sec']['median'] > 0 else 1.0
+        rss_ratio = result['peak_rss_bytes'] / old['peak_rss_bytes'] if old['peak_rss_bytes'] > 0 else 1.0
+        verdict = ""
+        if ratio > 1 + threshold:
+            verdict = "  SLOWER"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            verdict = "  faster"
+        print(f"{stage:<18}time x{ratio:.2f}  peak RSS x{rss_ratio:.2f}{verdict}", file=out)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="抽出処理のベンチマークスイート")
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--lines", type=int, default=400)
+    parser.add_argument("--density", type=float, default=0.05, help='台詞に含まれる漢検漢字の割合')
+    parser.add_argument("--density-spread", type=float, default=0.03, help='ファイルごとの漢検漢字の割合のばらつき')
+    parser.add_argument("--formats", nargs='+', default=['srt', 'ass'], choices=['srt', 'ass'])
+    parser.add_argument("--encodings", nargs='+', default=['utf-8', 'utf-8-sig'])
+    parser.add_argument("--tag-rate", type=float, default=0.3, help='ASSの台詞に上書きタグを付ける割合')
+    parser.add_argument("--notes", type=int, default=20000, help='疑似Ankiデッキのノート数')
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--font", type=str, default=None)
+    parser.add_argument("--stages", nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument("--output", type=str, default=None, help='結果のJSONを書き出すパス（"-"で標準出力）')
+    parser.add_argument("--compare", type=str, default=None, help='比較する以前の結果のJSON')
+    parser.add_argument("--threshold", type=float, default=0.1, help='--compare で遅くなったとみなす割合（デフォルト: 0.1）')
+    parser.add_argument("--force-compare", action='store_true', help='--compare で設定（ファイル数・行数・ノート数・シード・ジョブ数など）が異なっても比較する')
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, json.loads(args.config))
+        return 0
+
+    from corpus import generate_corpus
+
+    commit, dirty = git_revision()
+    config = {
+        'files': args.files, 'lines': args.lines, 'density': args.density, 'density_spread': args.density_spread,
+        'formats': args.formats, 'encodings': args.encodings, 'tag_rate': args.tag_rate,
+        'notes': args.notes, 'seed': args.seed, 'repeat': args.repeat, 'jobs': args.jobs, 'font': args.font,
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        corpus = os.path.join(workdir, 'corpus')
+        generate_corpus(
+            corpus, files=args.files, lines_per_file=args.lines, density=args.density, seed=args.seed,
+            formats=args.formats, encodings=args.encodings, tag_rate=args.tag_rate, density_spread=args.density_spread
+        )
+        for stage in args.stages:
+            results[stage] = measure(stage, dict(config, corpus=corpus, workdir=workdir))
+
+    report = {
+        'meta': {
+            'commit': commit, 'dirty': dirty, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'config': config,
+        },
+        'results': results,
+    }
+
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_results(results)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        # JSONを標準出力に書き出した場合、比較結果は標準エラー出力に表示する
+        out = sys.stderr if args.output == '-' else sys.stdout
+        mismatches = config_mismatches(config, baseline)
+        if mismatches:
+            print("\n" + "!" * 60, file=sys.stderr)
+            print(f"{args.compare} とベンチマークの設定が異なるため、結果を比較できません:", file=sys.stderr)
+            for key, old, new in mismatches:
+                print(f"  {key}: {old!r} -> {new!r}", file=sys.stderr)
+            print("!" * 60, file=sys.stderr)
+            if not args.force_compare:
+                print("同じ設定で計測し直すか、--force-compare で比較してください。", file=sys.stderr)
+                return 2
+        if compare_results(results, baseline, args.threshold, out=out):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
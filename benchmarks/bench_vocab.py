@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+語彙（熟語）照合のマイクロベンチマーク。
+
+単語ごとに `word in line` で探す素朴な方法と、
+Aho-Corasick オートマトン（VocabularyMatcher）による1パス照合を比較する。
+
+    python benchmarks/bench_vocab.py [--lines 50000] [--words 5000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from corpus import JOYO_SAMPLE, make_line  # noqa: E402
+from kankensub import KanjiUtils, VocabularyMatcher  # noqa: E402
+
+
+def make_words(count, seed=0):
+    # 漢検漢字と常用漢字を組み合わせた2〜4文字の疑似熟語を生成する
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    return ["".join(rng.choice(kanken) if rng.random() < 0.5 else rng.choice(JOYO_SAMPLE) for _ in range(rng.randint(2, 4))) for _ in range(count)]
+
+
+def make_lines(count, words, seed=0, word_rate=0.3):
+    # 一部の行に単語を埋め込んだ疑似字幕行を生成する
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    lines = []
+    for _ in range(count):
+        line = make_line(rng, kanken)
+        if rng.random() < word_rate:
+            position = rng.randrange(len(line))
+            line = line[:position] + rng.choice(words) + line[position:]
+        lines.append(line)
+    return lines
+
+
+def naive_scan(lines, words):
+    hits = 0
+    for text in lines:
+        text = KanjiUtils.normalize_text(text)
+        hits += sum(1 for word in words if word in text)
+    return hits
+
+
+def automaton_scan(lines, matcher):
+    hits = 0
+    for text in lines:
+        hits += len(set(matcher.find_words(text)))
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="語彙照合のマイクロベンチマーク")
+    parser.add_argument("--lines", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    matcher = VocabularyMatcher(make_words(args.words))
+    build = time.perf_counter() - start
+    words = matcher.words
+    lines = make_lines(args.lines, words)
+
+    for text in lines[:1000]:
+        normalized = KanjiUtils.normalize_text(text)
+        assert set(matcher.find_words(text)) == {word for word in words if word in normalized}, text
+
+    naive = min(timeit.repeat(lambda: naive_scan(lines, words), number=1, repeat=args.repeat))
+    automaton = min(timeit.repeat(lambda: automaton_scan(lines, matcher), number=1, repeat=args.repeat))
+
+    print(f"lines: {args.lines}, words: {len(words)}")
+    print(f"build (Aho-Corasick): {build:.3f}s")
+    print(f"naive     (word in line): {naive:.3f}s ({args.lines / naive:,.0f} lines/s)")
+    print(f"automaton (1 pass)      : {automaton:.3f}s ({args.lines / automaton:,.0f} lines/s)")
+    print(f"speedup: {naive / automaton:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
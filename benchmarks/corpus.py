@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""ベンチマーク用の疑似字幕コーパスを生成するヘルパー。"""
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from kankensub import KanjiUtils  # noqa: E402
+
+FILLER = "今日はいい天気ですね。明日も晴れるといいな！そんなことないよ、大丈夫だって。ちょっと待ってください"
+JOYO_SAMPLE = "日本語漢字勉強単語意味読方書"
+
+# ASSの台詞に付ける上書きタグ（フォント名の漢字もテキストの一部として数えられる）
+ASS_OVERRIDE_TAGS = [
+    r"{\i1}", r"{\b1}", r"{\an8}", r"{\pos(960,1000)}", r"{\fad(200,200)}",
+    r"{\c&H00FFFF&}", r"{\fs60\bord3}", r"{\fn游ゴシック}", r"{\k25}", r"{\blur2}",
+]
+
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Noto Sans JP,64,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,3,1,2,40,40,40,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+def make_line(rng, kanken, density=0.05, length=24):
+    # 漢検漢字を density の割合で混ぜた台詞を1行生成する
+    return "".join(rng.choice(kanken) if rng.random() < density else rng.choice(FILLER) for _ in range(length))
+
+
+def format_srt_time(ms):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def format_ass_time(ms):
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}.{ms // 10:02d}"
+
+
+def make_ass_text(rng, kanken, density=0.05, tag_rate=0.3):
+    # 上書きタグと改行（\N）を含むASSの台詞を生成する
+    text = make_line(rng, kanken, density)
+    head, tail = text[:12], text[12:]
+    if rng.random() < tag_rate / 3:
+        position = rng.randrange(1, len(head))
+        head = head[:position] + rng.choice(ASS_OVERRIDE_TAGS) + head[position:]
+    text = head + ("\\N" if rng.random() < 0.2 else "") + tail
+    if rng.random() < tag_rate:
+        text = rng.choice(ASS_OVERRIDE_TAGS) + text
+    return text
+
+
+def write_subtitle(path, texts, encoding='utf-8'):
+    # texts を3秒間隔の字幕として、拡張子に応じた形式で書き出す
+    if path.endswith('.ass'):
+        content = ASS_HEADER + "".join(
+            f"Dialogue: 0,{format_ass_time(line * 3000)},{format_ass_time(line * 3000 + 2500)},Default,,0,0,0,,{text}\n"
+            for line, text in enumerate(texts)
+        )
+    else:
+        content = "".join(
+            f"{line + 1}\n{format_srt_time(line * 3000)} --> {format_srt_time(line * 3000 + 2500)}\n{text}\n\n"
+            for line, text in enumerate(texts)
+        )
+    with open(path, 'w', encoding=encoding) as f:
+        f.write(content)
+
+
+def generate_corpus(directory, files=100, lines_per_file=400, density=0.05, seed=0, formats=('srt', 'ass'), encodings=('utf-8', 'utf-8-sig'), tag_rate=0.3, density_spread=0.0):
+    """
+    directory に .srt・.ass ファイルを files 個生成し、パスのリストを返す。
+    形式と文字コードはファイルごとに formats・encodings から順番に割り当てる。
+    density_spread を指定すると、ファイルごとの漢検漢字の割合を density ± density_spread の範囲でばらつかせる。
+    同じ引数なら同じ内容になる。
+    """
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for index in range(files):
+        extension = formats[index % len(formats)]
+        encoding = encodings[index % len(encodings)]
+        file_density = min(1.0, max(0.0, density + rng.uniform(-density_spread, density_spread)))
+        path = os.path.join(directory, f"Synthetic.Show.S{index // 100 + 1:02d}E{index % 100 + 1:03d}.{extension}")
+        if extension == 'ass':
+            texts = [make_ass_text(rng, kanken, file_density, tag_rate) for _ in range(lines_per_file)]
+        else:
+            texts = [make_line(rng, kanken, file_density) for _ in range(lines_per_file)]
+        write_subtitle(path, texts, encoding)
+        paths.append(path)
+
+    return paths
+
+
+def make_anki_deck(words, seed=0):
+    # 漢検漢字を含む熟語をHTMLやふりがな付きで生成する
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    deck = []
+    for _ in range(words):
+        word = "".join(rng.choice(kanken) if rng.random() < 0.5 else rng.choice(JOYO_SAMPLE) for _ in range(rng.randint(1, 4)))
+        style = rng.random()
+        if style < 0.3:
+            word = f"<b>{word}</b>"
+        elif style < 0.6:
+            word = f" {word}[よみがな]"
+        elif style < 0.7:
+            word = f"<div>{word}</div><br>"
+        elif style < 0.75:
+            # 音声ファイル名に含まれる漢字は数えてはいけない
+            word = f"{word}[sound:{rng.choice(kanken)}.mp3]"
+        deck.append(word)
+    return deck
+
+
+def generate_srt_corpus(directory, files=100, lines_per_file=400, density=0.05, seed=0):
+    """
+    directory に .srt ファイルを files 個生成し、パスのリストを返す。
+    同じ seed なら同じ内容になる。
+    """
+    rng = random.Random(seed)
+    kanken = "".join(KanjiUtils.kanken_kanji_data.values())
+    os.makedirs(directory, exist_ok=True)
+
+    paths = []
+    for index in range(files):
+        path = os.path.join(directory, f"Synthetic.Show.S01E{index + 1:03d}.srt")
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in range(lines_per_file):
+                start = line * 3000
+                f.write(f"{line + 1}\n{format_srt_time(start)} --> {format_srt_time(start + 2500)}\n")
+                f.write(f"{make_line(rng, kanken, density)}\n\n")
+        paths.append(path)
+
+    return paths
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+ベンチマーク用の疑似AnkiConnectサーバー。
+
+AnkiHandler が使う findNotes・notesInfo だけを実装し、make_anki_deck で生成した
+notes 件のノートを返す。"edited:N" を含む検索では、末尾の edited_fraction の割合のノートを
+「最近編集されたノート」として返すので、差分同期も計測できる。
+
+    python benchmarks/fake_anki.py [--notes 20000] [--port 8765]
+
+単体で起動した場合は、kankensub.py --anki-url http://127.0.0.1:8765 --deck Bench --word Word で
+実際のスクリプトからも接続できる。
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from corpus import make_anki_deck  # noqa: E402
+
+FIRST_NOTE_ID = 1500000000000
+
+
+class FakeAnkiConnect:
+    """
+    別スレッドで動く疑似AnkiConnectサーバー。with文で使うと終了時に停止する。
+    """
+
+    def __init__(self, notes=20000, word_field='Word', edited_fraction=0.01, port=0, seed=0):
+        self.word_field = word_field
+        self.words = make_anki_deck(notes, seed)
+        self.note_ids = [FIRST_NOTE_ID + index for index in range(notes)]
+        self.edited_ids = self.note_ids[len(self.note_ids) - int(notes * edited_fraction):]
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def _invoke(self, action, params):
+        if action == 'findNotes':
+            return self.edited_ids if 'edited:' in params.get('query', '') else self.note_ids
+        if action == 'notesInfo':
+            return [
+                {
+                    'noteId': note_id,
+                    'mod': note_id // 1000,
+                    'fields': {self.word_field: {'value': self.words[note_id - FIRST_NOTE_ID], 'order': 0}},
+                }
+                for note_id in params.get('notes', [])
+            ]
+        if action == 'version':
+            return 6
+        raise ValueError(f"unsupported action: {action}")
+
+    def _make_handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # AnkiHandler はkeep-alive接続を使うので HTTP/1.1 で応答する
+            protocol_version = 'HTTP/1.1'
+            # ヘッダーと本文を別々に送るため、Nagleアルゴリズムで応答が遅れないようにする
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                fake.requests += 1
+                try:
+                    response = {'result': fake._invoke(request['action'], request.get('params', {})), 'error': None}
+                except ValueError as e:
+                    response = {'result': None, 'error': str(e)}
+                body = json.dumps(response, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="疑似AnkiConnectサーバー")
+    parser.add_argument("--notes", type=int, default=20000)
+    parser.add_argument("--word-field", type=str, default='Word')
+    parser.add_argument("--edited-fraction", type=float, default=0.01)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    fake = FakeAnkiConnect(args.notes, args.word_field, args.edited_fraction, port=args.port)
+    print(f"{fake.url} で {args.notes:,}件のノートを提供しています。Ctrl+Cで終了します。")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,39 +1,209 @@
 #!/Library/Frameworks/Python.framework/Versions/3.9/bin/python3.9
 # -*- coding: utf-8 -*-
 
+import time
+
+# 起動時間の計測用（--profile-startup）
+_startup_begin = time.perf_counter()
+
 import os
 import sys
-import urllib.request
 import regex as re
 import unicodedata
 import json
 import argparse
-import socket
-import pysubs2
+import importlib
+import functools
 import math
-
-from concurrent.futures import ProcessPoolExecutor, as_completed
-from collections import defaultdict
-from tqdm import tqdm
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfbase import pdfmetrics
-from kanjize import kanji2number
-
+import sqlite3
+import hashlib
+import heapq
+import zlib
+import contextlib
+import io
+
+from array import array
+from collections import Counter, deque
+from itertools import chain, islice
+
+# pysubs2・tqdm・kanjize・reportlab、およびAnki接続・並列処理用の標準モジュールは
+# _lazy_import で必要になった時点で読み込む
 font_path = "NotoSansJP-VariableFont_wght.ttf"
 font_name = "NotoSansJP"
 
-try:
-    pdfmetrics.registerFont(TTFont(font_name, font_path))
-    print(f"フォント '{font_name}' の登録に成功しました。")
-except Exception as e:
-    print(f"⚠️ フォント '{font_name}' の登録中にエラーが発生しました: {e}")
-    if "postscript outlines are not supported" in str(e).lower():
-        print("エラー: フォントがPostScriptアウトラインを使用しているため、ReportLabではサポートされていません。")
-        print("💡 解決策: フォントをTrueType (TTF) に変換するか、別のフォントを使用してください。")
-    sys.exit(1)  # プログラムを終了
+_import_times = {}
+_main_started = _startup_begin
+_registered_font_path = None
+
+
+def _lazy_import(name):
+    """
+    重いモジュールを初めて使うときに読み込む関数。
+    読み込みにかかった時間は --profile-startup で表示する。
+    """
+    module = sys.modules.get(name)
+    if module is None:
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        _import_times[name] = time.perf_counter() - start
+    return module
+
+
+def register_pdf_font(path=None):
+    """
+    PDF出力用のフォントを登録する（PDF出力が必要になったときにプロセスごとに一度だけ）。
+    ReportLabは使用したグリフだけをサブセットとして埋め込むため、PDFのサイズは文字数に比例する。
+    """
+    global _registered_font_path
+    pdfmetrics = _lazy_import('reportlab.pdfbase.pdfmetrics')
+    if font_name in pdfmetrics.getRegisteredFontNames():
+        return
+
+    TTFont = _lazy_import('reportlab.pdfbase.ttfonts').TTFont
+    path = path or font_path
+    try:
+        pdfmetrics.registerFont(TTFont(font_name, path))
+        _registered_font_path = path
+        print(f"フォント '{font_name}' の登録に成功しました。")
+    except Exception as e:
+        print(f"⚠️ フォント '{font_name}' の登録中にエラーが発生しました: {e}")
+        if "postscript outlines are not supported" in str(e).lower():
+            print("エラー: フォントがPostScriptアウトラインを使用しているため、ReportLabではサポートされていません。")
+            print("💡 解決策: フォントをTrueType (TTF) に変換するか、別のフォントを使用してください。")
+        sys.exit(1)  # プログラムを終了
+
+
+def print_startup_profile():
+    # 起動時間と遅延読み込みしたモジュールの読み込み時間を表示する
+    print("\n----- 起動時間 -----")
+    print(f"スクリプトの読み込み: {(_main_started - _startup_begin) * 1000:.1f} ms")
+    for name, seconds in _import_times.items():
+        print(f"{name} の読み込み: {seconds * 1000:.1f} ms")
+    print(f"合計: {(time.perf_counter() - _startup_begin) * 1000:.1f} ms")
+
+
+_XML_ESCAPE_TABLE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+def xml_escape(text):
+    # PDFの段落に渡すテキストの & < > をエスケープする（xml.sax.saxutils は urllib.request などを読み込むため使わない）
+    return text.translate(_XML_ESCAPE_TABLE)
+
+
+class RunStats:
+    """
+    処理段階ごとの実時間・CPU時間とカウンター（ファイル数・行数・読み込みバイト数・漢字ヒット数・読み込み失敗）を記録する。
+    ワーカープロセスで記録した値は snapshot() で親プロセスに返し、merge() で合算する。
+    """
+
+    MAX_FAILURES = 100  # 記録する読み込み失敗の最大件数（件数自体はすべて数える）
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.stages = {}   # 段階名: [実時間, CPU時間, 回数]
+        self.counters = Counter()
+        self.workers = {}  # プロセスID: [バッチ数, ファイル数, 実時間, CPU時間, 最長バッチの実時間]
+        self.failures = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # with文の中の処理時間を段階 name に加算する
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def add_stage(self, name, wall, cpu, calls=1):
+        entry = self.stages.setdefault(name, [0.0, 0.0, 0])
+        entry[0] += wall
+        entry[1] += cpu
+        entry[2] += calls
+
+    def add_worker_batch(self, files, wall, cpu, pid=None):
+        entry = self.workers.setdefault(pid or os.getpid(), [0, 0, 0.0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += files
+        entry[2] += wall
+        entry[3] += cpu
+        entry[4] = max(entry[4], wall)
+
+    def add_failure(self, file, error):
+        self.counters['parse_failures'] += 1
+        if len(self.failures) < RunStats.MAX_FAILURES:
+            self.failures.append((file, f"{type(error).__name__}: {error}"))
+
+    def snapshot(self):
+        # ワーカーから親プロセスに返す記録
+        return {'stages': self.stages, 'counters': self.counters, 'workers': self.workers, 'failures': self.failures}
+
+    def merge(self, snapshot):
+        for name, (wall, cpu, calls) in snapshot['stages'].items():
+            self.add_stage(name, wall, cpu, calls)
+        self.counters.update(snapshot['counters'])
+        for pid, (batches, files, wall, cpu, longest) in snapshot['workers'].items():
+            entry = self.workers.setdefault(pid, [0, 0, 0.0, 0.0, 0.0])
+            entry[0] += batches
+            entry[1] += files
+            entry[2] += wall
+            entry[3] += cpu
+            entry[4] = max(entry[4], longest)
+        self.failures.extend(snapshot['failures'][:RunStats.MAX_FAILURES - len(self.failures)])
+
+    def to_dict(self):
+        elapsed = time.perf_counter() - self.started
+        scan_wall = self.stages.get('scan', [0.0])[0]
+        rates = {}
+        for name in ('files_scanned', 'lines', 'bytes_read'):
+            rates[f"{name}_per_sec"] = self.counters[name] / scan_wall if scan_wall > 0 else 0.0
+        return {
+            'elapsed_sec': elapsed,
+            'stages': {name: {'wall_sec': wall, 'cpu_sec': cpu, 'calls': calls} for name, (wall, cpu, calls) in self.stages.items()},
+            'counters': dict(self.counters),
+            'rates': rates,
+            'workers': [
+                {'pid': pid, 'batches': batches, 'files': files, 'wall_sec': wall, 'cpu_sec': cpu, 'longest_batch_sec': longest}
+                for pid, (batches, files, wall, cpu, longest) in sorted(self.workers.items())
+            ],
+            'failures': [{'file': file, 'error': error} for file, error in self.failures],
+        }
+
+    def print_report(self):
+        stats = self.to_dict()
+        print("\n----- 処理統計 -----")
+        print(f"{'段階':<16}{'実時間(ms)':>12}{'CPU時間(ms)':>13}{'回数':>8}")
+        for name, stage in stats['stages'].items():
+            print(f"{name:<16}{stage['wall_sec'] * 1000:>12.1f}{stage['cpu_sec'] * 1000:>13.1f}{stage['calls']:>8}")
+        print()
+        for name, value in sorted(stats['counters'].items()):
+            print(f"{name}: {value}")
+        for name, value in stats['rates'].items():
+            print(f"{name}: {value:.1f}")
+        for worker in stats['workers']:
+            average = worker['wall_sec'] / worker['batches'] * 1000 if worker['batches'] else 0.0
+            print(
+                f"ワーカー {worker['pid']}: {worker['batches']}バッチ・{worker['files']}ファイル、"
+                f"実時間 {worker['wall_sec'] * 1000:.1f} ms（平均 {average:.1f} ms、最長 {worker['longest_batch_sec'] * 1000:.1f} ms）、"
+                f"CPU時間 {worker['cpu_sec'] * 1000:.1f} ms"
+            )
+        for failure in stats['failures']:
+            print(f"読み込み失敗: {failure['file']} ({failure['error']})")
+        print(f"合計: {stats['elapsed_sec'] * 1000:.1f} ms")
+
+    def dump_json(self, path):
+        # path が "-" なら標準出力に書き出す
+        if path == '-':
+            json.dump(self.to_dict(), sys.stdout, ensure_ascii=False, indent=2)
+            print()
+            return
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+# プロセスごとの計測結果（ワーカーでは処理ごとにリセットして親プロセスに返す）
+_run_stats = RunStats()
 
 
 class KanjiUtils:
@@ -46,6 +216,24 @@ class KanjiUtils:
         "1k": "乂几匕匚于兀孑尸已幺弋丫孒屮弌丐亢仍仄仆仂卅夬夭尹弖戈扎曰毋丕丱弍仗仞仭仟冉刋匆丗卉卮叮叨叭叺圦夲孕屶戉朮艾辷价伉伜冱凩刔刎匈卍吁夸奸妁屹幵并忖戍戌扞扛扣扠扨朿朸朶汕聿犲阡艸芍芒佚估佝佗佇佞兌冏刪劬劭甸匣吽听吭吼吮吶吩吝呎囮坎圻址坏夾妝妣妍孚孛尨屁岌岑岔巫彷忻忤忸忱忰扼抉找抒抓抖抃抔抛旱杙杣杠杞杆肛肚肓汞汪沍沚沁汨沂沐泛沛糺瓧矣狄狆狃阮阯阨邨疔芫芟芬芦竍罕豕巵沪删苆皁旰呏乖亟佶侈侏侘佻佩佰侑佯侖冽凭刮刳劼咏呵咎呟呷呻咀呶咄咐咆囹坩坡坿妲姆孥岫帚帙帑帛弩徂彿忝忿怡怙怩怛怕怫怦怏怺戔拗拑抻拆拈拌拊拇抬毟杲昊昃杳旻枌枉枋枡杪杼枅虱肭肬泓泗沽沮泝泄泅沱泪泯沾牀爬軋矼瓩氛炙炒衫狎狒羌陂邯邵邱疚疝籵歿殀氓苡苳茉苜苻苣范苞苙苟苹茆苴苺迚迪廸竏秉盂罔穹祀刱幷拋卹玫矻彽卻圀俔俟俎俘俛俑俚俐俤俥兪冑剏剄剋剌勁匍厖呱呰哇咢咸咥咬哄哈咨咫哂咤囿垓垠垤奕奐奎姨姜姙姚孩屎屏峙庠弭弯徊很徇怎怱恪恟恊恍恃恤恂恬恫扁拏挌拮拱挂拯拵畋鳬斫朏昜昴昶昵昿閂缸枴柯枷柤柞柩柮柬枳柢柎柝枹枸胙胝胛胚胥胄胖曷禹禺洸洽洌洟洶洵洒洫爰癸珈珀玻玳砒砌紆紂牴酊瓰瓲瓮瓱炸炮炬炳炯衵袂衲衽狢狡狠盻眇眈眄陋陌疣疥殃殄茴茯茱荀荅茲茹茵荐茗茘茫莽迢迥竓竕秕衍罘穽矜臾舁姸姮俞竽紉挘炷烟笋倚倨倔倪倥倅俶倡倩倬俾俯們倆冓冤冢凅剞剔勍叟哥哦唏唔哽哮哭哢唳圄埃埆埒奚奘娥娟娑娜娉宦宸屓峭峪恚恁恙悁悍悃悚悄悛悖悒悧悋拿挈捐捍捏捩旃旆旁旄晟晁晏耙耘栩栞桙框桎蚓蚪蚌蚩蚣蚋栲栫胱胯胼韋浣浙涕涓浹浚涅涎笏笆笊笄珮珥珞砠紊紕紜耿鬯舫烋烝烙訖訌訐衾袗袙袢袒袍躬狷倏羔眛眩陜陝陟陞郛郢郤疳痃痂疸疽疼疱莓莚莢莪莟莎莅芻茣莨荳莠殷荼荵莉畛畚豺耆耄逅迹迴迸竚站粃秣秬秧盍赳舐罠罟皰翅窈虔祗祠祚祓祟衄豈冦弉衮捓粏虒桛桄哳凊偃偕偐偈偖偬偸做冕剪剳勗匐匏唹啀售啜啅啖啗唸圉堊堋婀婬婉娵娶婢婪孰寇崟崛崑崔崢崚崙崘帷弸彗徙徘悸惓悴悽惆悵惘戛扈掖掎掀掫捶掏掉掟捫斛旌敖毬毫晞晤晧晨晢耜閊麸桿桝桀梳蛄蚰蛉蚯蚶蚫蛆桷梭梔梵桴梟梠梺梏梛梃脣脯脛脩曼跂趺趾鹵馗淹淬淒涵涸淅淙淆淪淌淤軛笘笞笵笳笨笙欸欷琅硅釵絅紿絆紵紮紲牾犁酖聆聊瓷瓸舸舳烱焉烽訛訝訥袞袤袰袿裃裄袱袵勒猊猜猖猗猝羝羚眷眥眦眸陬陲痍疵痊痒殍菽萢菠菎菴菲萃萍菫菁菘畤覓皎貶逑逕逞逧逡逖逋逍逎竟竡盒衒翊窕舂谺寃厠勖屛晣悤埳躮萁悾梻梲偷𣶏棊筍傀傚傅剴厥啣喙喀喊喟啻啾喘喞啼喃喇喨堙堝堡奠奢媚嫂孳寔寐屠孱嵌嵒嵎嵋幄幀幇廁廂弑彭徨愕惶愀惴惺愃惻愎戞掣掾揩揀揆揣揉揶揄敞敝黹毯毳朞晰閔蛞蛬蛩蛯蛔蛟棘椏椁棗棠椈椄棕椒椚棍棹棣腋脾腓腆腑跏跖跌跚跛跋颪渙渣湲渭湮湫渾湍渺渫游溂渟湎渝湃軻軫軼馮馭筌筅筐筝赧欹琥琲琺釿鈞鈕鈑鈔絖絎絣絨絏絮犂犇酣酥聒牋焜焙詛詈訶詁詆詒瓠裙覃靫猴猩猯猥睇隋隍鄂痙痞痣粢粤粨辜甦萼葩葷萸萵葯葭葆蒂畭畴覘釉皓皖貂耋貽賁逵竢竦稈稍趁舒觝皴翔翕窖窘厦腁筓畬孶逬晳跎裎愒喑焠猋堽韵亶傴僉僂剿剽勣勦飭勠匯嗚嗇嗟嗄嗜嗤嗔塋塒壼媼媾嫋媽寞尠嵬幃幎廈徭愆惷愍慍愾愧慊愴戡搆搦搶搓搗搏搨斟旒鳰鳧黽暈暉暘暄耡閘雹蜒蜉蜀蛻蜊蜍蜈蛹蜑蜆蜃椶楹椰楸楫楮椽楾榁楔楡楝椹楞腮腴腱腥腟跟跣跪跫滉溽滄溏溥溷滔滂溘溟溲軾輅輊輌筺筥筵筧筰筬筮筱筴麁歇歃肄肆雎雉雍雋瑟瑙瑁瑕瑜瑶髢碚硼碌鉗鉉鉞鉅鉋鉈鈿絳綏絽綉絛綛綟骭酩聘艀煥煢煌煬煖煦詭詢誄詬誅誂詼矮閙裔裘褂裼裲裨褄躱獏猾頏頌睫睨睛睚睥隗隕隘鄒痿痾痰痺痼痳痲瘁粱粳粲糀飩飫辟蒭蒿蓙蒟蓖蒡蓍蓆蒹蓁蓐蒻畸皙貊貉賈貲遐遒遖遏遑逾遉稟禀稠盞觚觜衙罧罨罩舅祺豢滓蜹輀瑇榆蜋魞觥筲蜓痹搤腠榀聟僊僖僥僣僮兢匱嘔嗷嘖嗾嗽嘛塹墅夐夥嫦嫣嫗嫩嫖孵寤寥嶇嶄嶂幗幔麼廖慇愨愿愬慂慷慚慴慥慟慝慓慵截搴摶摧摎敲曄暝閨閧蜴蜿蜚蜥蜻蜩蜷槓槁槎榻寨槐榧榾榴榑榜槊榕榔槃榱膃膈膀膂膊跼跿踉韶靤颯颱滾漲滬滸漱漾滲漓滷滌輒輓箘箜箍箝箒箏箚箙歉瑯瑣瑪瑰髦髣碪碣銜銖銕銓銛鋩綺綵緇綽綢綣綸綯綮綰綫骰犒犖酲酳聚聢甄甅甃熕熄煕熏誨誡誣誦誚誑誥裹裴褌褊褓褝靼鞁靺鞅鞆睾睹鄙瘧瘋瘉粽殞蓼蔗蔔蔡蔘蔟蓴蓿蔕覡遘竭竰趙皹皸翡窩禊厮槔髥劄綦慠摏厲塿澂僵儁儂儚冪凜凛劈匳噎嘶嘸墟嫺嫻嬌嬋嶢嶝幟幢廝廛廡慳慙慫憔憚憫憮戮撓撥撕撩撈黎麾鴉鴃鴆魴麩魃魄閭霄霈霆蝨蝠蝮蝌蝴蝙蝓蝗蝟蝎蝣蝸蟒槹槲槭樊槧槿樅樛樔樒槨膣膠踝踟踞膵漿滕潸潘澎潺潭澆潯潦濆輙輟輜輦輛駟駛駑駘駝篁篌篆篋箴瑩璋瑾髫髯髴髱磑磋碾磅碼磊鋏銹銷錵錺緤緞緘緲縅緝緡醋醂甍熨熙熈熬諄諚諍諂諛鬧褞褥褫褪鞐鞋鞏獗羯頡瞎瞑瞋鄲瘟瘠瘤瘢瘡糅糂餉餃殤靠蔬蕘蕕蕁蕈蕀皚貎賚遯遨稷皺翦翩禝臧豌鴂魳魸魬踑耦蝘蝲璇噁牖璢僭儕儔冀嘴噫噤嘯噬噪嚆圜壅嬖寰嶬嶮嶼廨廩彜徼憖憊憑懌懊懈懆憺懍擒撼擅撻擂黔鴟鴒鴕鴣鴪鮃鮓鮑鮗鮖暾暹曁耨麭閻閼閹閾霓霎霑霙霏霖蟇蟆螂螟橄橙樸橇橦橈檠膩蹂踵踰踴膰靦澡澪澣澹澳濛輻輹輳駮駱駭駢赭麈歔歙霍雕篝篩篥簑璞髻髷磔磬磧磚錏錙錣錻鋺錚縡縟縊縉縋縢縒骼甌甎艘艙熹熾燉燔燗燎諤諠諢謔諞諳諷諡鬨襁褸褶躾獪羲頤頷頽瞠瞞隧瘰瘴瘻糒餔餒殫殪蕣薊蕷蕾薔薨薀薑薜薛薈薇薐薤蕭覦覩遶邁盧盥罹窶臻臈墻鴥篡麇鮇頹赬篪縕薏﨟螈螗噦噯𩶗謌襍黏儡簒燮嚀嚊嚏壑嬲嬪嬶孺嶷懃懋懦擘擱擠擡擣擯龠鼾黜黝齔斂黻鵄鴿鵁鴾鵆氈鮟鮨鮠鮴朦曚闊濶闃闍闌罅蟋螽螳蟀螯螻螫蟄蠎檣檐檄檗檬檪蹊蹉蹌蹇蹐蹈臀臂膺膾臉牆馘颶濬濘濔轅轂輾駻騁駸麋歟歛雖簔篷簍簓簇簀簗篳磽磴鍼鍮鍠縻繆縹縵縺繃縲縷醢聳艚艝燵燧燠燬謚諱謇謐謗謖謨譁褻襄襌鞜獰顆瞰隰癇癆癈癘糜餡餤餞藉薹薺藐覯覬貘賻賽賺邂邀遽盪艱翳窿虧禧豁谿繈幫鮱鮲鵇糝螾蟎檋檔壎獮嚠嚔壙彝懣懴戳擲擺擽攅鼕黠鼬旛斃鵝鵞鵑鵤鵙鯀鯊鯒鯑鯏鮹魍魎魏闖闔闕霤蟠蟯櫁檸櫃櫂檳蹙蹠蹣蹤蹕臑臍瀋濺瀁瀏瀉瀑濾轆轌騅騏麌簣簧簟瓊鬆礒礑鎰鎹鎬繧繚繖繝繦繙繞髀醪馥聶甕甓釐艟燹燿燼燻謦謾鞫謳謫鬩襠鞦鞳鞨鞣顋瞼瞿矇瞻瞽癜餮餬殯藕藜覲贄贅邇邃穢穡觴羂羃翹竅竄騈鯎鯐鮸鵥鎺蟪蠆𫒼嚥嚮壜壟嬾廬懶攀黼鵲鶉鵺鶇鵯鯣鯢鯤鯲鯡鯔鯱鯰曠霪蠍蟾蟶蟷蠖櫟檻櫚蹶蹲蹼躇臘瀚瀛瀝瀟轎騙麕麑簷簽簫籀礙鏖鏘鏈鏤鏨鏃鏝鏐繹犢醯牘艤艢艨爍譌譚譏譎譛襞襦襪覈鞴獺羹羶羸隴饂餽餾殱韲靡蘊藾蘢藺藹蘋蘆疇疆贇羆龐鰙鶍鶎鶄蹻繳蠊儳嚬歠孼孽嚶孅孀巉懺懽攘黥齣齟齠鶚鶤鶫鶩鰓鰉鰔鰕鰌鰈鰆鰒鰊鰄鰛朧曦闡罌霰蠕蠑蘗櫨櫪蘖躅躄躁鹹臙臚韜飄瀾瀲瀰轗騫驀簪籌瓏礫礬鐚鏗鐔鐃鐐鐓繽纃辮繻醵醴瓣譫譬譟襭襤矍癢糯糲饉饅蘚贍贏蘯竇壥鶪櫱躃鼯騭鰚鰘韞衊櫸霸飜儺儷囂嚼囁囃囀囈巍廱懾懼黯齦齧鶲鷁鶻鶺鷆鶸鷂鰮鰥鰤鰰曩齎魑闢闥罍霹蠢蠡欅櫺躋躊飆轜驂驃騾麝籃籔籐籖瓔鬘鐫鐶鐺纈纐纉髏醺艪爛譖譴襯癧癪癨癩饐饌饑饋饒殲贔贐籒鰧纊儼儻巓巒彎懿攤龕齬齪鷙鷓鱆鱇鰾罎霽霾蠧躓躑躔灑轢驕驍籟鬚艫襴襷顫癬糴饕蘿覿鬻贓贖羇禳攢鼴籡籙糱癭鑒攣攫黴黐鷸鷦鷯鷭鱚蠱欒躙靨轤籥籤鬟鑠鑢鑞鑚纔纓髑讌讐讎韈癰齏邏鼹驎鱛鱏鱓顬曬𬵪囓齷齲齶鷽鼇鱠鱧魘靂靆靄蠹驟鬢鑪纛讙讖讒軈韆顰癲衢羈屭鱟鱩鑵攬黌鼈靉躡臠籬鬣鑰釁顱糶纘鬭黶鱶欖躪驥驢鑷鬮顴矚鱲黷鱸驤驩鑼鑾鑽顳鸛钁鑿纜癴驪爨鸞麤"
     }
 
+    # 漢検レベル（コードポイント表の値）
+    LEVEL_J1K = 1
+    LEVEL_J1K1K = 2
+    LEVEL_1K = 3
+    LEVEL_NAMES = {LEVEL_J1K: "準一級", LEVEL_J1K1K: "準一級／一級", LEVEL_1K: "一級"}
+
+    # Ankiのフィールドから取り除くマークアップ（HTMLタグ、ふりがな・[sound:...]などの角括弧）。閉じていない括弧が次の単語まで消さないよう、区切り文字はまたがない
+    ANKI_MARKUP_RE = re.compile(r'<[^>\x1f]*>|\[[^\]\x1f]*\]')
+    WORD_SEPARATOR = '\x1f'
+    # 字幕の書式タグ（ASSの上書きタグ、SRTのHTMLタグ、改行・空白の記号）
+    SUBTITLE_MARKUP_RE = re.compile(r'\{[^}]*\}|<[^>]*>|\\[Nnh]')
+
+    _kanken_sets = None
+    _kanken_union = None
+    _level_table = None
+    _scan_table = None
+    _normalize_table = None
+
     @staticmethod
     def is_kanji(unichar):
         # 文字が漢字かどうかを判定する関数
@@ -53,8 +241,80 @@ class KanjiUtils:
     
     @staticmethod
     def load_kanken_kanji_sets():
-        # 漢検漢字セットを読み込む関数
-        return set(KanjiUtils.kanken_kanji_data['j1k']), set(KanjiUtils.kanken_kanji_data['j1k1k']), set(KanjiUtils.kanken_kanji_data['1k'])
+        # 漢検漢字セットを読み込む関数（frozensetを一度だけ作って使い回す）
+        if KanjiUtils._kanken_sets is None:
+            KanjiUtils._kanken_sets = (
+                frozenset(KanjiUtils.kanken_kanji_data['j1k']),
+                frozenset(KanjiUtils.kanken_kanji_data['j1k1k']),
+                frozenset(KanjiUtils.kanken_kanji_data['1k']),
+            )
+            KanjiUtils._kanken_union = frozenset().union(*KanjiUtils._kanken_sets)
+        return KanjiUtils._kanken_sets
+
+    @staticmethod
+    def load_kanken_kanji_union():
+        # 全レベルの漢検漢字のfrozenset（レベルごとのセットと一緒に一度だけ作る）
+        KanjiUtils.load_kanken_kanji_sets()
+        return KanjiUtils._kanken_union
+
+    @staticmethod
+    def load_kanken_level_table():
+        """
+        コードポイント→漢検レベルの表（bytearray）を返す関数。
+        漢検漢字以外は0。一度だけ構築してクラスにキャッシュする。
+        """
+        if KanjiUtils._level_table is None:
+            levels = [
+                (KanjiUtils.LEVEL_1K, KanjiUtils.kanken_kanji_data['1k']),
+                (KanjiUtils.LEVEL_J1K1K, KanjiUtils.kanken_kanji_data['j1k1k']),
+                (KanjiUtils.LEVEL_J1K, KanjiUtils.kanken_kanji_data['j1k']),
+            ]
+            table = bytearray(max(ord(kanji) for _, data in levels for kanji in data) + 1)
+            # 重複がある場合は準一級 → 準一級／一級 → 一級の順で優先する（後から書き込んだものが勝つ）
+            for level, data in levels:
+                for kanji in data:
+                    table[ord(kanji)] = level
+            KanjiUtils._level_table = table
+        return KanjiUtils._level_table
+
+    @staticmethod
+    def get_kanken_level(kanji):
+        # 漢字の漢検レベルを返す（漢検漢字でなければ0）
+        table = KanjiUtils.load_kanken_level_table()
+        codepoint = ord(kanji)
+        return table[codepoint] if codepoint < len(table) else 0
+
+    @staticmethod
+    def load_kanken_scan_table():
+        # 字幕スキャン用のstr.translateテーブルを返す
+        if KanjiUtils._scan_table is None:
+            KanjiUtils._scan_table = _KankenScanTable(KanjiUtils.load_kanken_level_table())
+        return KanjiUtils._scan_table
+
+    @staticmethod
+    def group_by_level(kanji_iterable):
+        # 漢字を漢検レベルごとのセットに分ける（漢検漢字以外は無視する）
+        table = KanjiUtils.load_kanken_level_table()
+        groups = {level: set() for level in KanjiUtils.LEVEL_NAMES}
+        for kanji in kanji_iterable:
+            codepoint = ord(kanji)
+            if codepoint < len(table) and table[codepoint]:
+                groups[table[codepoint]].add(kanji)
+        return groups
+
+    @staticmethod
+    def coverage_by_level(kanji_iterable):
+        """
+        漢字（Ankiの漢字カウントのキーなど）がカバーしている漢検漢字をレベルごとに
+        {レベル: (カバーしている漢字のセット, そのレベルの漢字数)} で返す。
+        """
+        totals = dict(zip(KanjiUtils.LEVEL_NAMES, map(len, KanjiUtils.load_kanken_kanji_sets())))
+        return {level: (kanji, totals[level]) for level, kanji in KanjiUtils.group_by_level(kanji_iterable).items()}
+
+    @staticmethod
+    def extract_kanken_kanji(text):
+        # テキストから漢検漢字だけを出現順に残した文字列を返す（1パス）
+        return text.translate(KanjiUtils.load_kanken_scan_table())
 
     @staticmethod
     def extract_number_from_kanji(filename):
@@ -70,25 +330,35 @@ class KanjiUtils:
         # 見つからない場合は漢数字を抽出
         kanji_number = re.search(r'[一二三四五六七八九十百千万億兆]+', filename)
         if kanji_number:
-            return kanji2number(kanji_number.group())
+            return _lazy_import('kanjize').kanji2number(kanji_number.group())
 
         return float('inf')  #　何も見つからない場合は、ソート順を最後にするために大きな数値を返す
 
     @staticmethod
     def count_kanji_in_words(anki_words, kanken_j1k_set, kanken_j1k1k_set, kanken_1k_set):
-        # Ankiの単語リストに含まれる漢検漢字の出現回数をカウントする
-        kanji_occurrences = {kanji: 0 for kanji in kanken_j1k_set | kanken_j1k1k_set | kanken_1k_set}
-
-        # 各単語ごとに含まれる漢字をカウント
-        for word in anki_words:
-            unique_kanji_in_word = set(word) & kanji_occurrences.keys()
-            for kanji in unique_kanji_in_word:
-                kanji_occurrences[kanji] += 1
+        """
+        Ankiの単語リストに含まれる漢検漢字ごとに、その漢字を含む単語の数をカウントする。
+        全単語を区切り文字でつないでマークアップを1パスで取り除き、単語ごとの漢検漢字の集合を数える。
+        """
+        if (kanken_j1k_set, kanken_j1k1k_set, kanken_1k_set) == KanjiUtils.load_kanken_kanji_sets():
+            # 通常は読み込み済みのセットなので、和集合を作り直さずに使い回す
+            total_kanken_set = KanjiUtils.load_kanken_kanji_union()
+        else:
+            total_kanken_set = kanken_j1k_set | kanken_j1k1k_set | kanken_1k_set
+        deck_text = KanjiUtils.ANKI_MARKUP_RE.sub('', KanjiUtils.WORD_SEPARATOR.join(anki_words))
 
-        # 出現しなかった漢字を削除
-        kanji_occurrences = {k: v for k, v in kanji_occurrences.items() if v > 0}
+        # 各単語ごとに含まれる漢字をカウント（同じ単語内の重複は1回）
+        words = deck_text.split(KanjiUtils.WORD_SEPARATOR)
+        return dict(Counter(chain.from_iterable(map(total_kanken_set.intersection, words))))
 
-        return kanji_occurrences
+    @staticmethod
+    def normalize_text(text):
+        # 書式タグ・改行・空白・記号を取り除き、全角・半角などの表記を揃える（重複判定・語彙の照合用）
+        if KanjiUtils._normalize_table is None:
+            KanjiUtils._normalize_table = _NormalizeTable()
+        if '{' in text or '<' in text or '\\' in text:
+            text = KanjiUtils.SUBTITLE_MARKUP_RE.sub('', text)
+        return text.translate(KanjiUtils._normalize_table)
 
     @staticmethod
     def clean_text(text):
@@ -97,27 +367,214 @@ class KanjiUtils:
         return cleaned
 
 
+class _KankenScanTable(dict):
+    """
+    str.translate 用の遅延テーブル。漢検漢字はそのまま残し、それ以外の文字は削除する。
+    一度判定した文字の結果はキャッシュされるため、2回目以降はdictの参照だけで済む。
+    """
+
+    def __init__(self, level_table):
+        super().__init__()
+        self.level_table = level_table
+
+    def __missing__(self, codepoint):
+        keep = codepoint < len(self.level_table) and self.level_table[codepoint]
+        # 互換漢字（U+F900〜）などIS_NOT_JAPANESE_PATTERNで除去される文字は従来どおり対象外
+        if keep and KanjiUtils.IS_NOT_JAPANESE_PATTERN.match(chr(codepoint)):
+            keep = False
+        value = codepoint if keep else None
+        self[codepoint] = value
+        return value
+
+
+class _NormalizeTable(dict):
+    """
+    str.translate 用の遅延テーブル。文字ごとにNFKCで表記を揃え、空白・記号など英数字・かな・漢字以外の文字は削除する。
+    正規表現とunicodedata.normalizeを行ごとに呼ぶより速い。
+    """
+
+    def __missing__(self, codepoint):
+        value = ''.join(char for char in unicodedata.normalize('NFKC', chr(codepoint)) if char.isalnum()) or None
+        self[codepoint] = value
+        return value
+
+
+class _DigestReader(io.RawIOBase):
+    """
+    読み込んだバイト列でハッシュを更新しながら読むラッパー。
+    スキャン中に内容ハッシュも計算し、キャッシュに保存するときにファイルを読み直さずに済むようにする。
+    """
+
+    def __init__(self, raw, digest):
+        super().__init__()
+        self.raw = raw
+        self.digest = digest
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self.raw.readinto(buffer)
+        if size:
+            self.digest.update(memoryview(buffer)[:size])
+        return size
+
+    def close(self):
+        self.raw.close()
+        super().close()
+
+
 class FileUtils():
 
     SETTINGS_FILE = os.path.join(os.path.dirname(__file__), 'settings.json')
+    SUBTITLE_EXTENSIONS = ['.srt', '.ass', '.vtt']
+    DISCOVERY_WORKERS = 8  # ディレクトリを並行して読むスレッド数
 
     @staticmethod
     def get_files(target, extensions):
-        files = []
+        #　ファイルを漢数字や番号順（数字が見つからなかった場合はアルファベット順）でソートして返す
+        return sorted(FileUtils.iter_files(target, extensions), key=FileUtils.sort_key)
+
+    @staticmethod
+    def _scan_directory(directory, suffixes):
+        # 1つのディレクトリを読み、(字幕ファイル, サブディレクトリ) を返す。os.walkと同様に読めないディレクトリは無視する
+        files, subdirectories = [], []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    if is_dir:
+                        # os.walkと同様に、シンボリックリンクのディレクトリはたどらない
+                        if not entry.is_symlink():
+                            subdirectories.append(entry.path)
+                    elif entry.name.lower().endswith(suffixes):
+                        files.append(entry.path)
+                    elif ArchiveUtils.is_archive(entry.name):
+                        files.extend(ArchiveUtils.list_files(entry.path, suffixes))
+        except OSError:
+            pass
+        return files, subdirectories
 
+    @staticmethod
+    def iter_files(target, extensions, max_workers=None):
+        """
+        対象ディレクトリ以下の字幕ファイルを見つけた順に返すジェネレーター（順序は不定）。
+        サブディレクトリはバックグラウンドのスレッドで並行して読むので、呼び出し側が
+        ファイルを処理している間も探索が進む。
+        """
+        suffixes = tuple(ext.lower() for ext in extensions)
         if os.path.isfile(target):
-            if any(target.endswith(ext) for ext in extensions):
-                files = [target]
-        else:
-            for root, _, filenames in os.walk(target):
-                for filename in filenames:
-                    if any(filename.endswith(ext) for ext in extensions):
-                        files.append(os.path.join(root, filename))
+            if target.lower().endswith(suffixes):
+                yield target
+            elif ArchiveUtils.is_archive(target):
+                yield from ArchiveUtils.list_files(target, suffixes)
+            return
+
+        futures = _lazy_import('concurrent.futures')
+        found = _lazy_import('queue').SimpleQueue()
+        stop = _lazy_import('threading').Event()
+        started = time.perf_counter()
+
+        def walk():
+            try:
+                with futures.ThreadPoolExecutor(max_workers or FileUtils.DISCOVERY_WORKERS) as executor:
+                    pending = {executor.submit(FileUtils._scan_directory, target, suffixes)}
+                    while pending and not stop.is_set():
+                        done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                        for future in done:
+                            files, subdirectories = future.result()
+                            pending.update(executor.submit(FileUtils._scan_directory, directory, suffixes) for directory in subdirectories)
+                            if files:
+                                found.put(files)
+                    for future in pending:
+                        future.cancel()
+                # 呼び出し側の処理を待った時間を含めないよう、探索スレッドの完了時点で記録する
+                _run_stats.add_stage('discover', time.perf_counter() - started, 0.0)
+            finally:
+                found.put(None)
+
+        _lazy_import('threading').Thread(target=walk, daemon=True).start()
+        try:
+            while True:
+                files = found.get()
+                if files is None:
+                    break
+                yield from files
+        finally:
+            stop.set()
+
+    @staticmethod
+    def basename(file):
+        # ファイル名。アーカイブのメンバーはメンバー名の最後の部分（"a.zip!S1/ep1.srt" → "ep1.srt"）
+        archive, member = ArchiveUtils.split(file)
+        if member is not None:
+            return member.rpartition('/')[2]
+        return os.path.basename(file)
+
+    @staticmethod
+    def stat(file):
+        # (mtime_ns, サイズ) を返す。アーカイブのメンバーはアーカイブのmtimeとメンバーのサイズ。見つからなければOSError
+        archive, member = ArchiveUtils.split(file)
+        if member is not None:
+            return ArchiveUtils.stat(archive, member)
+        stat = os.stat(file)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def exists(file):
+        try:
+            FileUtils.stat(file)
+        except OSError:
+            return False
+        return True
+
+    @staticmethod
+    def open_binary(file):
+        archive, member = ArchiveUtils.split(file)
+        if member is not None:
+            return ArchiveUtils.open_member(archive, member)
+        return open(file, 'rb')
+
+    @staticmethod
+    def open_text(file, encoding='utf-8-sig', digest=None):
+        # 通常のファイルもアーカイブのメンバーも、展開せずにテキストとして開く
+        # digest（hashlibのハッシュオブジェクト）を指定すると、読み込んだバイト列でそのハッシュを更新する
+        if digest is not None:
+            return io.TextIOWrapper(io.BufferedReader(_DigestReader(FileUtils.open_binary(file), digest)), encoding=encoding)
+        archive, member = ArchiveUtils.split(file)
+        if member is not None:
+            return io.TextIOWrapper(ArchiveUtils.open_member(archive, member), encoding=encoding)
+        return open(file, encoding=encoding)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def sort_key(file):
+        # 表示用のソートキー（話数の数字・漢数字、ファイル名）。同じファイルの計算結果は使い回す
+        basename = FileUtils.basename(file)
+        return (KanjiUtils.extract_number_from_kanji(basename), basename)
 
-            #　ファイルを漢数字や番号順（数字が見つからなかった場合はアルファベット順）でソート
-            files.sort(key=lambda f: (KanjiUtils.extract_number_from_kanji(os.path.basename(f)), os.path.basename(f)))
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def display_filename(file):
+        # レポートに表示するファイル名（同じファイルの整形結果は使い回す）
+        return FileUtils.clean_filename(FileUtils.basename(file))
 
-        return files
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def series_name(file):
+        # ファイルのシリーズ名（話数を除いたタイトル。取れない場合はフォルダ名）
+        cleaned = FileUtils.clean_filename(FileUtils.basename(file))
+        title = re.sub(r'(S\d+E\d+|EP?\d+)', '', cleaned, flags=re.IGNORECASE).strip()
+        archive, member = ArchiveUtils.split(file)
+        if member is not None:
+            # アーカイブの直下にあるメンバーは、アーカイブ名をフォルダ名の代わりにする
+            folder = member.rpartition('/')[0].rpartition('/')[2] or ArchiveUtils.stem(archive)
+        else:
+            folder = os.path.basename(os.path.dirname(file))
+        return title or folder or cleaned
 
     @staticmethod
     def clean_filename(filename):
@@ -160,8 +617,895 @@ class FileUtils():
         return None
 
 
+class ArchiveUtils:
+    """
+    zip・tar（7zは py7zr がある場合のみ）の中の字幕ファイルを「アーカイブ!メンバー」形式のパスで扱う。
+    メンバーはディスクに展開せず、アーカイブから直接読み込む。
+    """
+
+    SEPARATOR = '!'
+    ZIP_EXTENSIONS = ('.zip',)
+    TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+    SEVEN_ZIP_EXTENSIONS = ('.7z',)
+    EXTENSIONS = ZIP_EXTENSIONS + TAR_EXTENSIONS + SEVEN_ZIP_EXTENSIONS
+
+    _warned_missing_7z = False
+
+    @staticmethod
+    def is_archive(path):
+        return path.lower().endswith(ArchiveUtils.EXTENSIONS)
+
+    @staticmethod
+    def split(file):
+        # "アーカイブ!メンバー" を (アーカイブ, メンバー) に分ける。通常のファイルなら (file, None)
+        position = file.find(ArchiveUtils.SEPARATOR)
+        while position != -1:
+            if ArchiveUtils.is_archive(file[:position]):
+                return file[:position], file[position + 1:]
+            position = file.find(ArchiveUtils.SEPARATOR, position + 1)
+        return file, None
+
+    @staticmethod
+    def join(archive, member):
+        return f"{archive}{ArchiveUtils.SEPARATOR}{member}"
+
+    @staticmethod
+    def stem(archive):
+        # アーカイブ名から拡張子（.tar.gz なども）を除いた名前
+        name = os.path.basename(archive)
+        for extension in sorted(ArchiveUtils.EXTENSIONS, key=len, reverse=True):
+            if name.lower().endswith(extension):
+                return name[:-len(extension)]
+        return name
+
+    @staticmethod
+    def _py7zr():
+        # py7zr は任意の依存。無ければ一度だけ警告して None を返す
+        try:
+            return _lazy_import('py7zr')
+        except ImportError:
+            if not ArchiveUtils._warned_missing_7z:
+                ArchiveUtils._warned_missing_7z = True
+                print("py7zrがインストールされていないため、7zアーカイブは読み飛ばします（pip install py7zr）")
+            return None
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _members(archive, mtime_ns):
+        # アーカイブ内の通常ファイルを {メンバー名: サイズ} で返す（mtimeが変わるまで使い回す）
+        lower = archive.lower()
+        try:
+            if lower.endswith(ArchiveUtils.ZIP_EXTENSIONS):
+                with _lazy_import('zipfile').ZipFile(archive) as zf:
+                    return {info.filename: info.file_size for info in zf.infolist() if not info.is_dir()}
+            if lower.endswith(ArchiveUtils.SEVEN_ZIP_EXTENSIONS):
+                py7zr = ArchiveUtils._py7zr()
+                if py7zr is None:
+                    return {}
+                with py7zr.SevenZipFile(archive) as sz:
+                    return {info.filename: info.uncompressed for info in sz.list() if not info.is_directory}
+            with _lazy_import('tarfile').open(archive) as tf:
+                return {info.name: info.size for info in tf.getmembers() if info.isfile()}
+        except OSError:
+            raise
+        except Exception as e:
+            # 壊れたアーカイブは読めないファイルとして扱う
+            raise OSError(f"{archive}: {e}") from e
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _open_archive(archive, mtime_ns):
+        # 開いたzip・tarをプロセス内で使い回す（ワーカーは _init_scan_worker で破棄してから使う）
+        if archive.lower().endswith(ArchiveUtils.ZIP_EXTENSIONS):
+            return _lazy_import('zipfile').ZipFile(archive)
+        return _lazy_import('tarfile').open(archive)
+
+    @staticmethod
+    def list_files(archive, suffixes):
+        # アーカイブ内の字幕ファイルを「アーカイブ!メンバー」形式のパスで返す。読めないアーカイブは空
+        try:
+            members = ArchiveUtils._members(archive, os.stat(archive).st_mtime_ns)
+        except OSError as e:
+            _run_stats.add_failure(archive, e)
+            return []
+        return [ArchiveUtils.join(archive, member) for member in members if member.lower().endswith(suffixes)]
+
+    @staticmethod
+    def stat(archive, member):
+        mtime_ns = os.stat(archive).st_mtime_ns
+        members = ArchiveUtils._members(archive, mtime_ns)
+        if member not in members:
+            raise FileNotFoundError(ArchiveUtils.join(archive, member))
+        return mtime_ns, members[member]
+
+    @staticmethod
+    def open_member(archive, member):
+        # メンバーをバイナリのファイルオブジェクトとして開く
+        mtime_ns = os.stat(archive).st_mtime_ns
+        if archive.lower().endswith(ArchiveUtils.SEVEN_ZIP_EXTENSIONS):
+            py7zr = ArchiveUtils._py7zr()
+            if py7zr is None:
+                raise FileNotFoundError(ArchiveUtils.join(archive, member))
+            # 7zは固体圧縮で任意の位置から読めないため、メンバーごとに開き直す
+            with py7zr.SevenZipFile(archive) as sz:
+                return sz.read([member])[member]
+        try:
+            handle = ArchiveUtils._open_archive(archive, mtime_ns)
+            if archive.lower().endswith(ArchiveUtils.ZIP_EXTENSIONS):
+                return handle.open(member)
+            extracted = handle.extractfile(member)
+        except KeyError:
+            raise FileNotFoundError(ArchiveUtils.join(archive, member)) from None
+        if extracted is None:
+            raise FileNotFoundError(ArchiveUtils.join(archive, member))
+        return extracted
+
+
+class SubtitleTokenizer:
+    """
+    pysubs2を使わずに字幕ファイルを1行ずつ読み、(開始時刻ms, テキスト) を順に返す軽量トークナイザー。
+    SSAEventオブジェクトを作らず、ファイル全体もメモリに読み込まない。
+    """
+
+    SRT_TIME_RE = re.compile(r'(\d+):(\d+):(\d+)[,.](\d+)\s*-->')
+    VTT_TIME_RE = re.compile(r'(?:(\d+):)?(\d+):(\d+)\.(\d+)\s*-->')  # WebVTTは時間を省略できる
+    ASS_TIME_RE = re.compile(r'(\d+):(\d+):(\d+)[.,](\d+)')
+    HTML_TAG_RE = re.compile(r'<[^>]*>')
+
+    @staticmethod
+    def _to_ms(hours, minutes, seconds, fraction):
+        # 小数部は桁数に関係なくミリ秒に揃える（"5" → 500, "50" → 500, "500" → 500）
+        return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction[:3].ljust(3, '0'))
+
+    @staticmethod
+    def iter_lines(file, digest=None):
+        # 拡張子に応じて (開始時刻ms, テキスト) を返すジェネレーター
+        # digest を指定すると、最後まで読んだ時点でファイル内容のハッシュになる
+        with FileUtils.open_text(file, digest=digest) as f:
+            if file.lower().endswith(('.ass', '.ssa')):
+                yield from SubtitleTokenizer._iter_ass(f)
+            elif file.lower().endswith('.vtt'):
+                # WebVTTのキューはSRTと同じ形。NOTE・STYLEブロックには時刻行が無いので読み飛ばされる
+                yield from SubtitleTokenizer._iter_srt(f, SubtitleTokenizer.VTT_TIME_RE)
+            else:
+                yield from SubtitleTokenizer._iter_srt(f)
+
+    @staticmethod
+    def _join_srt_text(text_lines):
+        # pysubs2と同様に複数行を \N でつなぎ、HTMLタグを取り除く
+        return SubtitleTokenizer.HTML_TAG_RE.sub('', r'\N'.join(text_lines))
+
+    @staticmethod
+    def _iter_srt(lines, time_re=SRT_TIME_RE):
+        start_time = None
+        text_lines = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                if start_time is not None and text_lines:
+                    yield start_time, SubtitleTokenizer._join_srt_text(text_lines)
+                start_time, text_lines = None, []
+                continue
+
+            match = time_re.match(line)
+            if match:
+                # 空行なしで次の字幕が始まった場合は、直前の番号行を除いて前の字幕を出力する
+                if text_lines and text_lines[-1].isdigit():
+                    text_lines.pop()
+                if start_time is not None and text_lines:
+                    yield start_time, SubtitleTokenizer._join_srt_text(text_lines)
+                start_time, text_lines = SubtitleTokenizer._to_ms(*match.groups()), []
+            elif start_time is not None:
+                text_lines.append(line)
+
+        if start_time is not None and text_lines:
+            yield start_time, SubtitleTokenizer._join_srt_text(text_lines)
+
+    @staticmethod
+    def _iter_ass(lines):
+        in_events = False
+        fields = None
+        for line in lines:
+            line = line.strip()
+            if line.startswith('['):
+                in_events = line.lower() == '[events]'
+                continue
+            if not in_events:
+                continue
+
+            key, _, value = line.partition(':')
+            key = key.strip().lower()
+            if key == 'format':
+                fields = [field.strip().lower() for field in value.split(',')]
+            elif key in ('dialogue', 'comment') and fields:
+                # pysubs2と同様に、コメント行（Comment:）の台詞も返す
+                values = value.lstrip().split(',', len(fields) - 1)
+                if len(values) != len(fields):
+                    continue
+                event = dict(zip(fields, values))
+                match = SubtitleTokenizer.ASS_TIME_RE.match(event.get('start', '').strip())
+                if match:
+                    yield SubtitleTokenizer._to_ms(*match.groups()), event.get('text', '')
+
+
+class ScanCache:
+    """
+    字幕ファイルごとのスキャン結果を保存するSQLiteキャッシュ。
+    漢検漢字を含む行（開始時刻, テキスト）だけを保存し、mtime・サイズ・内容ハッシュで無効化する。
+    """
+
+    CACHE_FILE = os.path.join(os.path.dirname(__file__), 'scan_cache.sqlite3')
+    SCHEMA_VERSION = 2
+
+    def __init__(self, path=None, rebuild=False):
+        self.path = path or ScanCache.CACHE_FILE
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        # 漢検漢字データやテーブルの形式が変わった場合は保存済みの結果が使えないので作り直す
+        version = f"{ScanCache.SCHEMA_VERSION}:{ScanCache._kanken_data_digest()}"
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if rebuild or row is None or row[0] != version:
+            self.conn.execute("DROP TABLE IF EXISTS files")
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, digest TEXT, lines BLOB, fingerprint TEXT)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def _kanken_data_digest():
+        data = json.dumps(KanjiUtils.kanken_kanji_data, sort_keys=True, ensure_ascii=False)
+        return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+    @staticmethod
+    def new_digest():
+        # 内容ハッシュ用のハッシュオブジェクト（スキャン中に読み込んだバイト列で更新する）
+        return hashlib.blake2b(digest_size=16)
+
+    @staticmethod
+    def file_digest(file):
+        # ファイル内容のハッシュを計算する
+        h = ScanCache.new_digest()
+        with FileUtils.open_binary(file) as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    @staticmethod
+    def _encode_lines(lines):
+        return zlib.compress(json.dumps(lines, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def _decode_lines(blob):
+        return [tuple(line) for line in json.loads(zlib.decompress(blob).decode('utf-8'))]
+
+    def lookup(self, file):
+        """
+        キャッシュ済みの行 [(開始時刻, テキスト), ...] とテキストの指紋を (行, 指紋) で返す。無効・未登録の場合はNone。
+        指紋は重複を処理する設定でスキャンしていなければNone。
+        mtimeやサイズが変わっていても内容ハッシュが同じなら再利用する。
+        """
+        key = os.path.abspath(file)
+        row = self.conn.execute("SELECT mtime_ns, size, digest, lines, fingerprint FROM files WHERE path = ?", (key,)).fetchone()
+        if row is None:
+            return None
+
+        try:
+            current_mtime_ns, current_size = FileUtils.stat(file)
+        except OSError:
+            return None
+
+        mtime_ns, size, digest, blob, fingerprint = row
+        if current_mtime_ns != mtime_ns or current_size != size:
+            if current_size != size or ScanCache.file_digest(file) != digest:
+                return None
+            self.conn.execute("UPDATE files SET mtime_ns = ? WHERE path = ?", (current_mtime_ns, key))
+
+        if fingerprint is not None:
+            line_count, sketch = json.loads(fingerprint)
+            fingerprint = (line_count, tuple(sketch))
+        return ScanCache._decode_lines(blob), fingerprint
+
+    def cached_digest(self, file):
+        # ファイルが変更されていなければ、保存済みの内容ハッシュを返す（未登録・変更済みならNone）
+        row = self.conn.execute("SELECT mtime_ns, size, digest FROM files WHERE path = ?", (os.path.abspath(file),)).fetchone()
+        if row is None:
+            return None
+        try:
+            signature = FileUtils.stat(file)
+        except OSError:
+            return None
+        return row[2] if signature == row[:2] else None
+
+    def store(self, file, lines, fingerprint, signature=None):
+        # 漢検漢字を含む行 [(開始時刻, テキスト), ...] とテキストの指紋を保存する
+        # signature はスキャン時に得た (mtime_ns, サイズ, 内容ハッシュ)。無ければファイルを読み直して計算する
+        if signature is not None:
+            mtime_ns, size, digest = signature
+        else:
+            try:
+                mtime_ns, size = FileUtils.stat(file)
+                digest = ScanCache.file_digest(file)
+            except OSError:
+                return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files (path, mtime_ns, size, digest, lines, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+            (os.path.abspath(file), mtime_ns, size, digest, ScanCache._encode_lines(lines), None if fingerprint is None else json.dumps(fingerprint))
+        )
+
+    def prune(self):
+        # 削除されたファイルのエントリを取り除き、削除数を返す
+        stale = [(path,) for (path,) in self.conn.execute("SELECT path FROM files") if not FileUtils.exists(path)]
+        self.conn.executemany("DELETE FROM files WHERE path = ?", stale)
+        self.conn.commit()
+        return len(stale)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class KanjiIndex:
+    """
+    漢字→出現箇所の永続的な転置インデックス（SQLite）。
+    スキャン結果をファイル単位で書き込み、字幕を読み直さずに漢字の出現箇所・頻度を検索できる。
+    漢字ごと・シリーズごとの出現回数は集計テーブルに差分で反映するため、上位k件の検索も索引だけで済む。
+    """
+
+    INDEX_FILE = os.path.join(os.path.dirname(__file__), 'kanji_index.sqlite3')
+
+    def __init__(self, path=None, rebuild=False):
+        self.path = path or KanjiIndex.INDEX_FILE
+        self.conn = sqlite3.connect(self.path)
+        if rebuild:
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS lines; DROP TABLE IF EXISTS postings;"
+                "DROP TABLE IF EXISTS kanji_stats; DROP TABLE IF EXISTS series_stats; DROP TABLE IF EXISTS anki;"
+            )
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, series TEXT NOT NULL, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS lines (id INTEGER PRIMARY KEY, file_id INTEGER NOT NULL, start_ms INTEGER NOT NULL, text TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS lines_file ON lines (file_id);
+            CREATE TABLE IF NOT EXISTS postings (kanji TEXT NOT NULL, line_id INTEGER NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (kanji, line_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_line ON postings (line_id);
+            CREATE TABLE IF NOT EXISTS kanji_stats (kanji TEXT PRIMARY KEY, level INTEGER NOT NULL, count INTEGER NOT NULL);
+            CREATE INDEX IF NOT EXISTS kanji_stats_count ON kanji_stats (count DESC);
+            CREATE TABLE IF NOT EXISTS series_stats (kanji TEXT NOT NULL, series TEXT NOT NULL, count INTEGER NOT NULL, PRIMARY KEY (kanji, series)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS anki (kanji TEXT PRIMARY KEY, count INTEGER NOT NULL);
+        """)
+        self.conn.commit()
+
+    def _update_stats(self, series, file_counts, sign):
+        # 集計テーブルにファイル1つ分の出現回数を加算（sign=-1なら減算）する
+        self.conn.executemany(
+            "INSERT INTO kanji_stats (kanji, level, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (kanji) DO UPDATE SET count = count + excluded.count",
+            [(kanji, KanjiUtils.get_kanken_level(kanji), sign * count) for kanji, count in file_counts.items()]
+        )
+        self.conn.executemany(
+            "INSERT INTO series_stats (kanji, series, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (kanji, series) DO UPDATE SET count = count + excluded.count",
+            [(kanji, series, sign * count) for kanji, count in file_counts.items()]
+        )
+        if sign < 0:
+            self.conn.execute("DELETE FROM kanji_stats WHERE count <= 0")
+            self.conn.execute("DELETE FROM series_stats WHERE count <= 0")
+
+    def is_current(self, file):
+        # ファイルが変更されておらず、インデックスの内容がそのまま使えるかどうか
+        row = self.conn.execute("SELECT mtime_ns, size FROM files WHERE path = ?", (os.path.abspath(file),)).fetchone()
+        if row is None:
+            return False
+        try:
+            return row == FileUtils.stat(file)
+        except OSError:
+            return False
+
+    def remove_file(self, file):
+        # ファイルの出現箇所をインデックスから取り除く
+        row = self.conn.execute("SELECT id, series FROM files WHERE path = ?", (os.path.abspath(file),)).fetchone()
+        if row is None:
+            return
+        file_id, series = row
+
+        file_counts = dict(self.conn.execute(
+            "SELECT p.kanji, SUM(p.count) FROM postings p JOIN lines l ON p.line_id = l.id WHERE l.file_id = ? GROUP BY p.kanji",
+            (file_id,)
+        ))
+        self._update_stats(series, file_counts, -1)
+        self.conn.execute("DELETE FROM postings WHERE line_id IN (SELECT id FROM lines WHERE file_id = ?)", (file_id,))
+        self.conn.execute("DELETE FROM lines WHERE file_id = ?", (file_id,))
+        self.conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def add_file(self, file, lines):
+        # ファイルの漢検漢字を含む行 [(開始時刻, テキスト), ...] を書き込む（既存の内容は置き換える）
+        self.remove_file(file)
+        try:
+            signature = FileUtils.stat(file)
+        except OSError:
+            signature = (-1, -1)
+        series = FileUtils.series_name(file)
+        file_id = self.conn.execute(
+            "INSERT INTO files (path, series, mtime_ns, size) VALUES (?, ?, ?, ?)", (os.path.abspath(file), series, *signature)
+        ).lastrowid
+
+        file_counts = Counter()
+        postings = []
+        for start_time, text in lines:
+            line_counts = Counter(KanjiUtils.extract_kanken_kanji(text))
+            if not line_counts:
+                continue
+            line_id = self.conn.execute(
+                "INSERT INTO lines (file_id, start_ms, text) VALUES (?, ?, ?)", (file_id, start_time, text)
+            ).lastrowid
+            postings.extend((kanji, line_id, count) for kanji, count in line_counts.items())
+            file_counts.update(line_counts)
+
+        self.conn.executemany("INSERT INTO postings (kanji, line_id, count) VALUES (?, ?, ?)", postings)
+        self._update_stats(series, file_counts, 1)
+
+    def set_anki_counts(self, anki_kanji_dict):
+        # 「Ankiにない漢字」の検索用に、Ankiの漢字カウントを保存する
+        self.conn.execute("DELETE FROM anki")
+        self.conn.executemany("INSERT INTO anki (kanji, count) VALUES (?, ?)", anki_kanji_dict.items())
+
+    def lookup(self, kanji, limit=10):
+        # 1つの漢字の出現回数・シリーズ別の回数・出現箇所を返す。インデックスに無ければNone
+        row = self.conn.execute("SELECT level, count FROM kanji_stats WHERE kanji = ?", (kanji,)).fetchone()
+        if row is None:
+            return None
+        level, count = row
+        anki_row = self.conn.execute("SELECT count FROM anki WHERE kanji = ?", (kanji,)).fetchone()
+        series_counts = self.conn.execute(
+            "SELECT series, count FROM series_stats WHERE kanji = ? ORDER BY count DESC, series", (kanji,)
+        ).fetchall()
+        examples = self.conn.execute(
+            "SELECT f.path, l.start_ms, l.text FROM postings p JOIN lines l ON p.line_id = l.id JOIN files f ON l.file_id = f.id "
+            "WHERE p.kanji = ? ORDER BY f.path, l.start_ms LIMIT ?",
+            (kanji, limit)
+        ).fetchall()
+        return {
+            'kanji': kanji,
+            'level': level,
+            'count': count,
+            'anki_count': anki_row[0] if anki_row else 0,
+            'series': series_counts,
+            'examples': examples,
+        }
+
+    def top(self, k=20, not_in_anki=False, max_anki_cards=0):
+        # 出現回数の多い漢字を [(漢字, レベル, 回数, Ankiカード数), ...] で返す
+        query = (
+            "SELECT s.kanji, s.level, s.count, COALESCE(a.count, 0) FROM kanji_stats s "
+            "LEFT JOIN anki a ON a.kanji = s.kanji "
+        )
+        params = []
+        if not_in_anki:
+            query += "WHERE COALESCE(a.count, 0) <= ? "
+            params.append(max_anki_cards)
+        query += "ORDER BY s.count DESC, s.kanji LIMIT ?"
+        params.append(k)
+        return self.conn.execute(query, params).fetchall()
+
+    def prune(self):
+        # 削除されたファイルをインデックスから取り除き、削除数を返す（パスは絶対パスで保存している）
+        stale = [path for (path,) in self.conn.execute("SELECT path FROM files") if not FileUtils.exists(os.path.abspath(path))]
+        for path in stale:
+            self.remove_file(path)
+        self.conn.commit()
+        return len(stale)
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class OccurrenceStore:
+    """
+    漢字の出現箇所をコンパクトに保持するクラス。
+    ファイルパスは文字列テーブルに、行はファイルごとの行ストアに一度だけ保存し、
+    漢字ごとにはファイルIDと行番号（array('i')）だけを最大 max_examples 件保持する。
+    出現回数は上限に関係なくすべて数える。
+    keep_all_lines=False の場合は用例として参照される行だけを保持するため、メモリ使用量は
+    （漢字数 × max_examples）行で頭打ちになる。
+    vocabulary に語彙リストのパスを指定した場合は、漢字の代わりに語彙の単語の出現箇所を保持する。
+    """
+
+    def __init__(self, max_examples=10, keep_all_lines=True, vocabulary=None):
+        self.max_examples = max_examples
+        self.keep_all_lines = keep_all_lines
+        self.vocabulary = vocabulary
+        self.files = []          # ファイルID → パス
+        self.file_ids = {}       # パス → ファイルID
+        self.line_starts = []    # ファイルID → 各行の開始時刻 (array('i'))
+        self.line_texts = []     # ファイルID → 各行のテキスト
+        self.counts = {}         # 漢字 → 総出現回数
+        self.example_files = {}  # 漢字 → 用例のファイルID (array('i'))
+        self.example_lines = {}  # 漢字 → 用例の行番号 (array('i'))
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, kanji):
+        return kanji in self.counts
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def keys(self):
+        return self.counts.keys()
+
+    def clear(self):
+        self.__init__(self.max_examples, self.keep_all_lines, self.vocabulary)
+
+    def line_keys(self, text):
+        # 行に含まれる漢検漢字（語彙モードでは単語）を重複ありで返す
+        if self.vocabulary is None:
+            return KanjiUtils.extract_kanken_kanji(text)
+        return VocabularyMatcher.load(self.vocabulary).find_words(text)
+
+    def file_id(self, file):
+        # ファイルパスをIDに変換する（未登録なら追加する）
+        file_id = self.file_ids.get(file)
+        if file_id is None:
+            file_id = len(self.files)
+            self.file_ids[file] = file_id
+            self.files.append(file)
+            self.line_starts.append(array('i'))
+            self.line_texts.append([])
+        return file_id
+
+    def add_line(self, file, start_time, text, kanji_chars):
+        # 漢検漢字を含む1行を追加する（kanji_charsは行中の漢検漢字、重複あり）
+        for kanji in kanji_chars:
+            self.counts[kanji] = self.counts.get(kanji, 0) + 1
+
+        example_kanji = [kanji for kanji in dict.fromkeys(kanji_chars) if not self.has_all_examples(kanji)]
+        if not example_kanji and not self.keep_all_lines:
+            return
+
+        file_id = self.file_id(file)
+        line_index = len(self.line_texts[file_id])
+        self.line_starts[file_id].append(start_time)
+        self.line_texts[file_id].append(text)
+        for kanji in example_kanji:
+            self._add_example(kanji, file_id, line_index)
+
+    def has_all_examples(self, kanji):
+        # 漢字の用例が上限まで集まっているかどうか
+        return self.max_examples is not None and len(self.example_files.get(kanji, ())) >= self.max_examples
+
+    def _add_example(self, kanji, file_id, line_index):
+        example_files = self.example_files.get(kanji)
+        if example_files is None:
+            example_files = self.example_files[kanji] = array('i')
+            self.example_lines[kanji] = array('i')
+        if self.max_examples is None or len(example_files) < self.max_examples:
+            example_files.append(file_id)
+            self.example_lines[kanji].append(line_index)
+
+    def merge(self, other, skip_files=()):
+        # 別のストア（ワーカーの結果など）を取り込む。skip_files のファイルの行は取り込まない
+        if skip_files:
+            # other の用例は除外するファイルの行で埋まっている場合があるので、残りのファイルの行から数え直す
+            # （other は keep_all_lines=True のストアであること）
+            for file, starts, texts in zip(other.files, other.line_starts, other.line_texts):
+                if file not in skip_files:
+                    for start_time, text in zip(starts, texts):
+                        self.add_line(file, start_time, text, self.line_keys(text))
+            return
+
+        file_id_map = array('i')
+        line_offsets = array('i')
+        for file, starts, texts in zip(other.files, other.line_starts, other.line_texts):
+            file_id = self.file_id(file)
+            file_id_map.append(file_id)
+            line_offsets.append(len(self.line_texts[file_id]))
+            self.line_starts[file_id].extend(starts)
+            self.line_texts[file_id].extend(texts)
+
+        for kanji, count in other.counts.items():
+            self.counts[kanji] = self.counts.get(kanji, 0) + count
+            # 用例を1件も持たない漢字もある（出現回数だけ数えた場合）
+            for file_id, line_index in zip(other.example_files.get(kanji, ()), other.example_lines.get(kanji, ())):
+                self._add_example(kanji, file_id_map[file_id], line_offsets[file_id] + line_index)
+
+    def remove_file(self, file):
+        """
+        ファイルの出現箇所をすべて取り除く（変更・削除されたファイルの再処理用）。
+        keep_all_lines=False の場合は保持していない行の出現回数を減らせないため、回数は概算になる。
+        """
+        file_id = self.file_ids.get(file)
+        if file_id is None:
+            return
+
+        for text in self.line_texts[file_id]:
+            for kanji in self.line_keys(text):
+                self.counts[kanji] -= 1
+
+        for kanji in list(self.example_files):
+            example_files, example_lines = self.example_files[kanji], self.example_lines[kanji]
+            if file_id in example_files:
+                kept = [(f, line) for f, line in zip(example_files, example_lines) if f != file_id]
+                self.example_files[kanji] = array('i', [f for f, _ in kept])
+                self.example_lines[kanji] = array('i', [line for _, line in kept])
+            if self.counts.get(kanji, 0) <= 0:
+                self.counts.pop(kanji, None)
+                del self.example_files[kanji], self.example_lines[kanji]
+
+        self.line_starts[file_id] = array('i')
+        self.line_texts[file_id] = []
+
+    def count(self, kanji):
+        return self.counts.get(kanji, 0)
+
+    def examples(self, kanji):
+        # 漢字の用例を [(ファイル, 開始時刻, テキスト), ...] で話数・時刻順に返す（処理順はファイルの完了順で不定のため）
+        return sorted(
+            (
+                (self.files[file_id], self.line_starts[file_id][line_index], self.line_texts[file_id][line_index])
+                for file_id, line_index in zip(self.example_files.get(kanji, ()), self.example_lines.get(kanji, ()))
+            ),
+            key=lambda example: (FileUtils.sort_key(example[0]), example[1])
+        )
+
+    def first_start(self, kanji):
+        # 最初の用例の開始時刻を返す（表示順のソートに使う。用例がない漢字は最後に並べる）
+        return min(
+            (
+                (FileUtils.sort_key(self.files[file_id]), self.line_starts[file_id][line_index])
+                for file_id, line_index in zip(self.example_files.get(kanji, ()), self.example_lines.get(kanji, ()))
+            ),
+            default=(None, float('inf'))
+        )[1]
+
+    def file_lines(self, file):
+        # ファイルの漢検漢字を含む行を [(開始時刻, テキスト), ...] で返す
+        file_id = self.file_ids.get(file)
+        if file_id is None:
+            return []
+        return list(zip(self.line_starts[file_id], self.line_texts[file_id]))
+
+
+class SubtitleDeduplicator:
+    """
+    同じエピソードの重複した字幕（リリースグループ違い・v2・.srtと.assの両方など）を検出するクラス。
+    内容が同一のファイルは読み込む前に内容ハッシュで、ほぼ同じ内容のファイルは読み込んだ後に
+    正規化したテキストの指紋で判定する。最初に処理したファイルを残し、以降の重複を記録する。
+    """
+
+    SKETCH_SIZE = 64      # 指紋に使う行ハッシュの数
+    SIMILARITY = 0.8      # 行の集合のJaccard係数がこれ以上なら重複とみなす
+    MIN_LINES = 20        # これより行の種類が少ないファイルはテキストで比較しない
+    MAX_POSTINGS = 64     # 行ハッシュごとに記録するファイル数の上限（OP・EDの歌詞など、多くの話数に共通する行用）
+
+    def __init__(self, cached_digest=None):
+        self.cached_digest = cached_digest  # 保存済みの内容ハッシュを返す関数（ScanCache.cached_digest。Noneなら毎回計算する）
+        self.clear()
+
+    def clear(self):
+        self.unhashed = {}      # サイズ → まだハッシュを計算していない最初のファイル
+        self.unhashed_sizes = {}  # まだハッシュを計算していないファイル → サイズ
+        self.hashed_sizes = set()
+        self.digests = {}       # 内容ハッシュ → 残したファイル
+        self.file_digests = {}  # 残したファイル → 内容ハッシュ
+        self.fingerprints = {}  # 残したファイル → 指紋
+        self.postings = {}      # 行ハッシュ → その行を指紋に含むファイル
+        self.duplicates = {}    # スキップしたファイル → (残したファイル, テキストの一致率。同一内容ならNone)
+        self.duplicates_of = {}  # 残したファイル → その重複としてスキップしたファイル
+
+    def __contains__(self, file):
+        # ファイルの記録があるかどうか（forget する必要があるかの判定用）
+        return file in self.unhashed_sizes or file in self.file_digests or file in self.fingerprints or file in self.duplicates
+
+    def _add_duplicate(self, file, kept, similarity):
+        self.duplicates[file] = (kept, similarity)
+        self.duplicates_of.setdefault(kept, []).append(file)
+
+    @staticmethod
+    def fingerprint(texts):
+        """
+        字幕のテキストの指紋 (行の種類数, 正規化した行のハッシュの小さい順 SKETCH_SIZE 個) を返す。
+        タイミング・行の順序・書式によらないため、同じ字幕のリリース違いは近い指紋になる。
+        """
+        return SubtitleDeduplicator.sketch({SubtitleDeduplicator.line_hash(text) for text in texts})
+
+    @staticmethod
+    def line_hash(text):
+        # 正規化した行のハッシュ（空行ならNone）。1行ずつ読みながら指紋を作る場合に使う
+        line = KanjiUtils.normalize_text(text)
+        if not line:
+            return None
+        return int.from_bytes(hashlib.blake2b(line.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    @staticmethod
+    def sketch(line_hashes):
+        # 行ハッシュの集合から指紋を作る
+        hashes = [line_hash for line_hash in line_hashes if line_hash is not None]
+        return len(hashes), tuple(heapq.nsmallest(SubtitleDeduplicator.SKETCH_SIZE, hashes))
+
+    @staticmethod
+    def similarity(a, b):
+        # 2つの指紋から行の集合のJaccard係数を推定する（和集合の小さい順 SKETCH_SIZE 個のうち両方に含まれる割合）
+        sketch_a, sketch_b = set(a[1]), set(b[1])
+        union = heapq.nsmallest(SubtitleDeduplicator.SKETCH_SIZE, sketch_a | sketch_b)
+        if not union:
+            return 0.0
+        return sum(1 for line_hash in union if line_hash in sketch_a and line_hash in sketch_b) / len(union)
+
+    def _add_digest(self, file):
+        # 内容ハッシュを登録し、同じ内容で先に登録されたファイル（なければ file 自身）を返す
+        # キャッシュ済みで変更されていないファイルは読み直さずに保存済みのハッシュを使う
+        digest = self.cached_digest(file) if self.cached_digest is not None else None
+        try:
+            if digest is None:
+                digest = ScanCache.file_digest(file)
+        except OSError:
+            return file
+        kept = self.digests.setdefault(digest, file)
+        if kept == file:
+            self.file_digests[file] = digest
+        return kept
+
+    def check_bytes(self, file):
+        # 内容が同一のファイルが既にあれば重複として記録して True を返す（ハッシュはサイズが同じファイルがある場合だけ計算する）
+        try:
+            size = FileUtils.stat(file)[1]
+        except OSError:
+            return False
+        if size not in self.hashed_sizes:
+            first = self.unhashed.pop(size, None)
+            if first is None:
+                self.unhashed[size] = file
+                self.unhashed_sizes[file] = size
+                return False
+            del self.unhashed_sizes[first]
+            self.hashed_sizes.add(size)
+            self._add_digest(first)
+
+        kept = self._add_digest(file)
+        if kept == file:
+            return False
+        self._add_duplicate(file, kept, None)
+        return True
+
+    def check_text(self, file, fingerprint):
+        # ほぼ同じテキストのファイルが既にあれば重複として記録して True を返す。なければ指紋を登録する
+        if fingerprint is None:
+            return False
+        line_count, sketch = fingerprint
+        if line_count < SubtitleDeduplicator.MIN_LINES:
+            return False
+
+        candidates = Counter(kept for line_hash in sketch for kept in self.postings.get(line_hash, ()))
+        for kept, _ in candidates.most_common(3):
+            similarity = SubtitleDeduplicator.similarity(fingerprint, self.fingerprints[kept])
+            if similarity >= SubtitleDeduplicator.SIMILARITY:
+                self._add_duplicate(file, kept, similarity)
+                return True
+
+        self.fingerprints[file] = fingerprint
+        for line_hash in sketch:
+            files = self.postings.setdefault(line_hash, [])
+            if len(files) < SubtitleDeduplicator.MAX_POSTINGS:
+                files.append(file)
+        return False
+
+    def forget(self, files):
+        """
+        変更・削除されたファイルの記録を取り除く。
+        それらのファイルの重複としてスキップしていたファイル（処理し直す必要がある）のリストを返す。
+        処理量は取り除くファイルとその重複の数だけに比例する。
+        """
+        revived = []
+        pending = list(files)
+        while pending:
+            skipped = []
+            for file in pending:
+                duplicate = self.duplicates.pop(file, None)
+                if duplicate is not None and file in self.duplicates_of.get(duplicate[0], ()):
+                    self.duplicates_of[duplicate[0]].remove(file)
+                digest = self.file_digests.pop(file, None)
+                if digest is not None and self.digests.get(digest) == file:
+                    del self.digests[digest]
+                fingerprint = self.fingerprints.pop(file, None)
+                for line_hash in fingerprint[1] if fingerprint else ():
+                    if file in self.postings.get(line_hash, ()):
+                        self.postings[line_hash].remove(file)
+                size = self.unhashed_sizes.pop(file, None)
+                if size is not None:
+                    del self.unhashed[size]
+                # スキップしていたファイルが残したファイルの重複だった場合は、さらにその重複も処理し直す
+                skipped.extend(self.duplicates_of.pop(file, ()))
+
+            # 一緒に取り除いたファイルは処理し直さない
+            skipped = [file for file in skipped if self.duplicates.pop(file, None) is not None]
+            revived.extend(skipped)
+            pending = skipped
+        return revived
+
+
+class VocabularyMatcher:
+    """
+    語彙リストの単語（熟語）を字幕の行から探すAho-Corasickオートマトン。
+    単語数によらず、1行を1回走査するだけですべての単語の出現（重なりを含む）を見つける。
+    単語と字幕の行はどちらも KanjiUtils.normalize_text で正規化してから照合する。
+    """
+
+    def __init__(self, words):
+        self.words = list(dict.fromkeys(word for word in map(KanjiUtils.normalize_text, words) if word))
+        self.goto = [{}]      # 状態 → {文字: 次の状態}
+        self.outputs = [()]   # 状態 → その状態で終わる単語
+        for word in self.words:
+            state = 0
+            for char in word:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = self.goto[state][char] = len(self.goto)
+                    self.goto.append({})
+                    self.outputs.append(())
+                state = next_state
+            self.outputs[state] = (word,)
+
+        # 幅優先で失敗遷移を作り、失敗先で終わる単語も出力に含める
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail_state = self.fail[state]
+                while fail_state and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                self.outputs[next_state] += self.outputs[self.fail[next_state]]
+        self.first_chars = frozenset(self.goto[0])
+
+    @staticmethod
+    def read_words(path):
+        # 1行1単語の語彙リストを読み込む。タブ・カンマ区切りなら最初の列を使い、空行と # で始まる行は無視する
+        words = []
+        with open(path, encoding='utf-8-sig') as f:
+            for line in f:
+                word = re.split(r'[\t,]', line.strip(), 1)[0].strip()
+                if word and not word.startswith('#'):
+                    words.append(word)
+        return words
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def load(path):
+        # 語彙リストからオートマトンを構築する。プロセスごとに一度だけ構築し、以降は使い回す
+        return VocabularyMatcher(VocabularyMatcher.read_words(path))
+
+    def find_words(self, text):
+        # 行に出現する単語を出現順に返す（同じ単語が複数回出現した場合はその回数だけ含む）
+        text = KanjiUtils.normalize_text(text)
+        if self.first_chars.isdisjoint(text):
+            return []
+
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        found = []
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found.extend(outputs[state])
+        return found
+
+
 class KankenSubtitleProcessor:
-    def __init__(self, kanken_j1k_set, kanken_j1k1k_set, kanken_1k_set, anki_kanji_dict, export=False, batch_size=100, verbose=False):
+    def __init__(self, kanken_j1k_set, kanken_j1k1k_set, kanken_1k_set, anki_kanji_dict, export=False, batch_size=100, verbose=False, cache=None, max_examples=10, stream=False, index=None, dedupe=True, vocabulary=None, anki_words=()):
         self.kanken_j1k_set = kanken_j1k_set
         self.kanken_j1k1k_set = kanken_j1k1k_set
         self.kanken_1k_set = kanken_1k_set
@@ -170,79 +1514,515 @@ class KankenSubtitleProcessor:
         self.export = export
         self.verbose = verbose
         self.batch_size = batch_size
-        self.kanji_timestamps = defaultdict(list)
+        self.max_examples = max_examples
+        self.stream = stream
+        # ストリーミングモードでは用例に使う行だけを保持してメモリ使用量を抑える
+        self.occurrences = OccurrenceStore(max_examples, keep_all_lines=not stream)
+        self.cache = cache
+        self.index = index
+        # 重複した字幕ファイルをスキップする（dedupe=False ならすべて処理する）
+        self.deduplicator = SubtitleDeduplicator(cache.cached_digest if cache is not None else None) if dedupe else None
+        # ほぼ同じテキストの判定はファイルごとに指紋を保持するため、メモリ使用量を一定に保つストリーミングモードでは
+        # 内容が同一のファイルだけを判定する
+        self.fingerprint = dedupe and not stream
+        # 語彙モード: vocabulary（語彙リストのパス）の単語の出現箇所も集計する
+        self.vocabulary = vocabulary
+        self.word_occurrences = OccurrenceStore(max_examples, keep_all_lines=not stream, vocabulary=vocabulary) if vocabulary else None
+        self.set_anki_words(anki_words)
 
 
-    def _extract_text_and_timestamps(self, file):
+    @staticmethod
+    def _extract_text_and_timestamps(file, verbose=False, signatures=None):
+        # signatures（dict）を指定すると、読み込んだバイト列から計算した (mtime_ns, サイズ, 内容ハッシュ) を入れる
         try:
-            subs = pysubs2.load(file)
+            mtime_ns, size = FileUtils.stat(file)
+            digest = ScanCache.new_digest() if signatures is not None else None
+            # アーカイブのメンバーも展開せずに読む（pysubs2.load と同じくUTF-8として解析する）
+            with FileUtils.open_text(file, 'utf-8', digest) as f:
+                subs = _lazy_import('pysubs2').SSAFile.from_file(f)
+            _run_stats.counters['bytes_read'] += size
+            if digest is not None:
+                signatures[file] = (mtime_ns, size, digest.hexdigest())
             return [(line.text, line.start, file) for line in subs]
         except Exception as e:
-            if self.verbose:
+            _run_stats.add_failure(file, e)
+            if verbose:
                 print(f"字幕ファイルの読み込みエラー ({file}): {e}")
             return []
 
 
-    def _process_batch(self, files):
-        local_kanji_timestamps = defaultdict(list)
-        
+    @staticmethod
+    def _process_batch(files, verbose=False, max_examples=10, fingerprint=True, vocabulary=None):
+        """
+        バッチの結果を (漢字の OccurrenceStore, {ファイル: テキストの指紋}, 語彙の単語の OccurrenceStore,
+        {ファイル: (mtime_ns, サイズ, 内容ハッシュ)}) で返す。
+        fingerprint=False なら指紋はNone、vocabulary（語彙リストのパス）を指定しなければ単語のストアはNone。
+        内容ハッシュは読み込んだバイト列から計算するので、キャッシュへの保存時にファイルを読み直さない（読み込みに失敗したファイルは含まない）。
+        """
+        local_occurrences = OccurrenceStore(max_examples)
+        word_occurrences = OccurrenceStore(max_examples, vocabulary=vocabulary) if vocabulary else None
+        fingerprints = {}
+        signatures = {}
+        batch_wall, batch_cpu = time.perf_counter(), time.process_time()
+        lines = hits = word_hits = 0
+
         for file in files:
-            subtitle_data = self._extract_text_and_timestamps(file)
-            for text, start_time, filename in subtitle_data:
-                cleaned_text = re.sub(KanjiUtils.IS_NOT_JAPANESE_PATTERN, '', text)
-                for kanji in filter(KanjiUtils.is_kanji, cleaned_text):
-                    local_kanji_timestamps[kanji].append((filename, start_time, text))
-        
-        return local_kanji_timestamps
+            with _run_stats.stage('scan.parse'):
+                subtitle_data = KankenSubtitleProcessor._extract_text_and_timestamps(file, verbose, signatures)
+            with _run_stats.stage('scan.classify'):
+                for text, start_time, filename in subtitle_data:
+                    kanji_chars = KanjiUtils.extract_kanken_kanji(text)
+                    if kanji_chars:
+                        local_occurrences.add_line(filename, start_time, text, kanji_chars)
+                        hits += len(kanji_chars)
+            if word_occurrences is not None:
+                with _run_stats.stage('scan.vocab'):
+                    for text, start_time, filename in subtitle_data:
+                        words = word_occurrences.line_keys(text)
+                        if words:
+                            word_occurrences.add_line(filename, start_time, text, words)
+                            word_hits += len(words)
+            fingerprints[file] = None
+            if fingerprint:
+                with _run_stats.stage('scan.fingerprint'):
+                    fingerprints[file] = SubtitleDeduplicator.fingerprint(text for text, _, _ in subtitle_data)
+            lines += len(subtitle_data)
+
+        _run_stats.counters.update(files_scanned=len(files), lines=lines, kanji_hits=hits)
+        if word_occurrences is not None:
+            _run_stats.counters['word_hits'] += word_hits
+        _run_stats.add_worker_batch(len(files), time.perf_counter() - batch_wall, time.process_time() - batch_cpu)
+        return local_occurrences, fingerprints, word_occurrences, signatures
+
+
+    @staticmethod
+    def _scan_file_streaming(file, verbose=False, fingerprint=True, vocabulary=None):
+        """
+        1ファイルをトークナイザーで読み、(ファイル, 漢検漢字を含む行 [(開始時刻, テキスト, 漢検漢字), ...], テキストの指紋,
+        語彙の単語を含む行 [(開始時刻, テキスト, 単語), ...], (mtime_ns, サイズ, 内容ハッシュ)) を返す。
+        1行ずつ読みながら判定し、漢検漢字（語彙の単語）を含む行と指紋用の行ハッシュだけを保持する。
+        内容ハッシュも読みながら計算する（読み込みに失敗した場合はNone）。
+        """
+        file_wall, file_cpu = time.perf_counter(), time.process_time()
+        matcher = VocabularyMatcher.load(vocabulary) if vocabulary else None
+        lines = []
+        word_lines = []
+        line_hashes = set() if fingerprint else None
+        line_count = 0
+        signature = None
+        # 読み込みと判定を行ごとに交互に行うため、まとめて計測する
+        with _run_stats.stage('scan.stream'):
+            try:
+                mtime_ns, size = FileUtils.stat(file)
+                digest = ScanCache.new_digest()
+                for start_time, text in SubtitleTokenizer.iter_lines(file, digest):
+                    line_count += 1
+                    kanji_chars = KanjiUtils.extract_kanken_kanji(text)
+                    if kanji_chars:
+                        lines.append((start_time, text, kanji_chars))
+                    if matcher is not None:
+                        words = matcher.find_words(text)
+                        if words:
+                            word_lines.append((start_time, text, words))
+                    if line_hashes is not None:
+                        line_hashes.add(SubtitleDeduplicator.line_hash(text))
+                _run_stats.counters['bytes_read'] += size
+                signature = (mtime_ns, size, digest.hexdigest())
+            except Exception as e:
+                _run_stats.add_failure(file, e)
+                if verbose:
+                    print(f"字幕ファイルの読み込みエラー ({file}): {e}")
+                # 途中まで読んだ結果は使わない
+                lines, word_lines, line_count = [], [], 0
+                line_hashes = set() if fingerprint else None
+        fingerprint = SubtitleDeduplicator.sketch(line_hashes) if line_hashes is not None else None
+
+        if matcher is not None:
+            _run_stats.counters['word_hits'] += sum(len(words) for _, _, words in word_lines)
+        _run_stats.counters.update(files_scanned=1, lines=line_count, kanji_hits=sum(len(kanji_chars) for _, _, kanji_chars in lines))
+        _run_stats.add_worker_batch(1, time.perf_counter() - file_wall, time.process_time() - file_cpu)
+        return file, lines, fingerprint, word_lines, signature
+
+
+    @staticmethod
+    def _make_batches(files, jobs, max_batch_files=100):
+        """
+        ファイルサイズに応じてバッチを作るジェネレーター。
+        files がリストなら大きいファイルから順に詰めて、1ワーカーあたり4バッチ程度になるようにする。
+        探索中のイテレーターなら合計サイズが分からないので、それまでに見つかったファイルの合計サイズで目標を決める
+        （最初のバッチは小さくすぐにワーカーへ渡し、探索が進むにつれて大きくする）。
+        """
+        def file_size(file):
+            try:
+                return FileUtils.stat(file)[1]
+            except OSError:
+                return 0
+
+        total_bytes = None
+        if isinstance(files, (list, tuple)):
+            sizes = {file: file_size(file) for file in files}
+            total_bytes = sum(sizes.values())
+            files = sorted(files, key=sizes.get, reverse=True)
+            file_size = sizes.get
+
+        seen_bytes = 0
+        batch, batch_bytes = [], 0
+        for file in files:
+            size = file_size(file)
+            seen_bytes += size
+            batch.append(file)
+            batch_bytes += size
+            target_bytes = max(64 * 1024, math.ceil((seen_bytes if total_bytes is None else total_bytes) / (jobs * 4)))
+            if batch_bytes >= target_bytes or len(batch) >= max_batch_files:
+                yield batch
+                batch, batch_bytes = [], 0
+        if batch:
+            yield batch
+
+
+    def _load_cached_file(self, file, remaining=None):
+        # キャッシュに有効な結果があれば読み込んで True を返す（重複したファイルなら集計しない）
+        # remaining（用例が揃っていない対象漢字）を指定した場合は、読み込んだ行で用例が揃った漢字を取り除く
+        # 語彙モードでは漢検漢字を含まない行も照合するため、キャッシュは使わずに読み直す
+        cached = self.cache.lookup(file) if self.cache is not None and self.vocabulary is None else None
+        if cached is None:
+            return False
+
+        lines, fingerprint = cached
+        if fingerprint is None and self.fingerprint:
+            # 重複を処理しない設定でスキャンした結果なので、指紋を計算するためにスキャンし直す
+            return False
+        if self._is_text_duplicate(file, fingerprint):
+            return True
+        found_kanji = []
+        for start_time, text in lines:
+            kanji_chars = KanjiUtils.extract_kanken_kanji(text)
+            self.occurrences.add_line(file, start_time, text, kanji_chars)
+            found_kanji.extend(kanji_chars)
+        self._all_targets_found(remaining, found_kanji)
+        if self.index is not None and not self.index.is_current(file):
+            self.index.add_file(file, lines)
+        return True
+
+
+    def _skip_duplicate(self, file):
+        _run_stats.counters['files_duplicate'] += 1
+        if self.index is not None:
+            self.index.remove_file(file)
+
+
+    def _is_byte_duplicate(self, file):
+        # 内容が同一のファイルを処理済みなら True（読み込む前に判定する）
+        if self.deduplicator is None:
+            return False
+        with _run_stats.stage('dedupe'):
+            duplicate = self.deduplicator.check_bytes(file)
+        if duplicate:
+            self._skip_duplicate(file)
+        return duplicate
+
+
+    def _is_text_duplicate(self, file, fingerprint):
+        # ほぼ同じテキストのファイルを処理済みなら True
+        if self.deduplicator is None:
+            return False
+        with _run_stats.stage('dedupe'):
+            duplicate = self.deduplicator.check_text(file, fingerprint)
+        if duplicate:
+            self._skip_duplicate(file)
+        return duplicate
+
+
+    def _is_known_file(self, file):
+        # 集計結果か重複の記録にファイルが含まれているかどうか
+        return (
+            file in self.occurrences.file_ids
+            or (self.word_occurrences is not None and file in self.word_occurrences.file_ids)
+            or (self.deduplicator is not None and file in self.deduplicator)
+        )
+
+
+    def _forget_files(self, files):
+        """
+        変更・削除されたファイルの古い結果を取り除く。
+        それらのファイルの重複としてスキップしていた、処理し直す必要があるファイルのリストを返す。
+        """
+        for file in files:
+            self.occurrences.remove_file(file)
+            if self.word_occurrences is not None:
+                self.word_occurrences.remove_file(file)
+        if self.deduplicator is None:
+            return []
+        files = set(files)
+        return [file for file in self.deduplicator.forget(files) if file not in files and FileUtils.exists(file)]
+
+
+    def _add_batch_result(self, result):
+        # バッチモード: ワーカーの結果（_process_batch の戻り値）を保存・集計する
+        store, fingerprints, word_store, signatures = result
+        duplicates = {file for file, fingerprint in fingerprints.items() if self._is_text_duplicate(file, fingerprint)}
+        with _run_stats.stage('merge'):
+            self.occurrences.merge(store, skip_files=duplicates)
+            if word_store is not None:
+                self.word_occurrences.merge(word_store, skip_files=duplicates)
+        with _run_stats.stage('store'):
+            for file, fingerprint in fingerprints.items():
+                file_lines = store.file_lines(file)
+                if self.cache is not None:
+                    self.cache.store(file, file_lines, fingerprint, signatures.get(file))
+                if self.index is not None and file not in duplicates:
+                    self.index.add_file(file, file_lines)
+
+
+    def _commit_storage(self):
+        for storage in (self.cache, self.index):
+            if storage is not None:
+                storage.commit()
+
+
+    def _add_streamed_file(self, file, lines, fingerprint, word_lines=(), signature=None):
+        # ストリーミングモード: 1ファイル分の結果（_scan_file_streaming の戻り値）を保存・集計する
+        file_lines = [(start_time, text) for start_time, text, _ in lines]
+        if self.cache is not None:
+            with _run_stats.stage('store'):
+                self.cache.store(file, file_lines, fingerprint, signature)
+        if self._is_text_duplicate(file, fingerprint):
+            return
+        with _run_stats.stage('store'):
+            if self.index is not None:
+                self.index.add_file(file, file_lines)
+        with _run_stats.stage('merge'):
+            for start_time, text, kanji_chars in lines:
+                self.occurrences.add_line(file, start_time, text, kanji_chars)
+            for start_time, text, words in word_lines:
+                self.word_occurrences.add_line(file, start_time, text, words)
+
+
+    def _remaining_targets(self, targets):
+        # 用例がまだ揃っていない対象漢字（targets が None なら None）
+        if targets is None:
+            return None
+        return {kanji for kanji in targets if not self.occurrences.has_all_examples(kanji)}
+
+
+    def _all_targets_found(self, remaining, found_kanji):
+        # 追加した行の漢字 found_kanji のうち用例が揃った漢字を remaining から除き、すべて揃ったら True を返す
+        if remaining is None:
+            return False
+        if not remaining:
+            return True
+        remaining.difference_update([
+            kanji for kanji in found_kanji
+            if kanji in remaining and self.occurrences.has_all_examples(kanji)
+        ])
+        if remaining:
+            return False
+        if self.verbose:
+            print("すべての対象漢字の用例が揃ったため、スキャンを終了します。")
+        return True
+
 
+    def _worker_initargs(self):
+        return self.verbose, self.max_examples, self.fingerprint, self.vocabulary
 
-    def process_subtitle_files(self, files, max_workers=4):
-        self.kanji_timestamps.clear()
-        use_progress_bar = len(files) > 100
 
-        # Dynamic batch sizing
-        min_batch_size = 4
-        optimal_batches = min(32, len(files))  # Ensure we don't make too many batches
-        batch_size = max(min_batch_size, math.ceil(len(files) / optimal_batches))
+    def _iter_files_to_scan(self, files, discovered, remaining=None):
+        """
+        ファイルを受け取った順に discovered に記録し、キャッシュから読めない（スキャンが必要な）ファイルを返す。
+        変更されたファイルの古い結果は取り除き、その重複としてスキップしていたファイルも処理し直す。
+        remaining を指定した場合は、キャッシュだけで対象漢字の用例が揃った時点で終了する。
+        """
+        cached = scanned = 0
+        for found in files:
+            discovered.append(found)
+            # 処理済みのファイルが再び見つかった場合（監視モードでの変更など）だけ古い結果を取り除く
+            for file in [found] + (self._forget_files([found]) if self._is_known_file(found) else []):
+                if self._is_byte_duplicate(file):
+                    continue
+                with _run_stats.stage('cache.load'):
+                    loaded = self._load_cached_file(file, remaining)
+                if loaded:
+                    _run_stats.counters['files_cached'] += 1
+                    cached += 1
+                    if remaining is not None and not remaining:
+                        return
+                    continue
+                scanned += 1
+                yield file
+
+        if self.verbose and self.cache is not None:
+            print(f"キャッシュ済み: {cached}、スキャン対象: {scanned}")
+
+
+    def _scan_batch_inline(self, batch):
+        # ワーカーと同じ処理を親プロセスで行う
+        if self.stream:
+            return [KankenSubtitleProcessor._scan_file_streaming(file, self.verbose, self.fingerprint, self.vocabulary) for file in batch]
+        return KankenSubtitleProcessor._process_batch(batch, self.verbose, self.max_examples, self.fingerprint, self.vocabulary)
+
+
+    def _iter_scan_results(self, batches, jobs):
+        """
+        バッチを順にワーカーへ渡し、(バッチ, 結果) を完了した順に返す（ワーカーの計測結果は親プロセスに合算する）。
+        結果はバッチモードなら _process_batch、ストリーミングモードならファイルごとの _scan_file_streaming のリスト。
+        最初のバッチはプロセスを起動せずにその場で処理し、次のバッチがある場合だけプールを起動する
+        （プロセス数は jobs と先読みしたバッチ数の小さい方）。
+        実行中のバッチは jobs * 2 個までに抑え、探索が処理より先に進みすぎないようにする。
+        """
+        batches = iter(batches)
+        for batch in islice(batches, 1 if jobs > 1 else None):
+            # 1プロセスの場合はプールを起動せずにすべてそのまま処理する
+            yield batch, self._scan_batch_inline(batch)
+
+        # 小さな対象でワーカーを余分に起動しないよう、最大 jobs 個のバッチを先読みしてプロセス数を決める
+        ahead = list(islice(batches, jobs))
+        if len(ahead) <= 1:
+            for batch in ahead:
+                yield batch, self._scan_batch_inline(batch)
+            return
+
+        processes = len(ahead)
+        worker = _scan_files_worker if self.stream else _scan_batch_worker
+        with _lazy_import('multiprocessing').Pool(processes=processes, initializer=_init_scan_worker, initargs=self._worker_initargs()) as pool:
+            pending = deque()
+            for batch in chain(ahead, batches):
+                pending.append((batch, pool.apply_async(worker, (batch,))))
+                while pending and (len(pending) >= processes * 2 or pending[0][1].ready()):
+                    done_batch, async_result = pending.popleft()
+                    result, worker_stats = async_result.get()
+                    _run_stats.merge(worker_stats)
+                    yield done_batch, result
+            while pending:
+                done_batch, async_result = pending.popleft()
+                result, worker_stats = async_result.get()
+                _run_stats.merge(worker_stats)
+                yield done_batch, result
+
+
+    def _scan_files(self, files, jobs, remaining=None):
+        """
+        files（リストか、スキャンが必要なファイルのイテレーター）をバッチにまとめてスキャンし、結果をその場で集計する。
+        remaining を指定した場合は、すべての対象漢字の用例が上限まで揃った時点でスキャンを打ち切る。
+        """
+        # ファイル数は探索が終わるまで分からないので、その場合は件数だけの進捗を表示する
+        total = len(files) if isinstance(files, (list, tuple)) else None
+        results = self._iter_scan_results(KankenSubtitleProcessor._make_batches(files, jobs, self.batch_size), jobs)
+        progress = None
+        processed = 0
+        try:
+            for batch, result in results:
+                if self.stream:
+                    stop = False
+                    for file, lines, fingerprint, word_lines, signature in result:
+                        self._add_streamed_file(file, lines, fingerprint, word_lines, signature)
+                        stop = self._all_targets_found(remaining, (kanji for _, _, kanji_chars in lines for kanji in kanji_chars)) or stop
+                    if stop:
+                        break
+                else:
+                    self._add_batch_result(result)
+
+                processed += len(batch)
+                if progress is None and (processed if total is None else total) > 100:
+                    progress = _lazy_import('tqdm').tqdm(total=total, desc="字幕処理中", unit="ファイル", initial=processed)
+                elif progress is not None:
+                    progress.update(len(batch))
+        finally:
+            results.close()
+            if progress is not None:
+                progress.close()
+            self._commit_storage()
+
+
+    def process_subtitle_files(self, files, max_workers=None, targets=None):
+        # files はリストか、探索中のファイルのイテレーター。処理したファイルのリストを返す
+        self.occurrences.clear()
+        if self.word_occurrences is not None:
+            self.word_occurrences.clear()
+        if self.deduplicator is not None:
+            self.deduplicator.clear()
+        return self.update_subtitle_files(files, max_workers, targets)
+
+
+    def update_subtitle_files(self, files, max_workers=None, targets=None):
+        """
+        現在の集計結果にファイルを追加し、受け取ったファイルのリストを返す。処理済みのファイルは古い結果を置き換える。
+        files が探索中のイテレーターなら、探索の完了を待たずに見つかった順に処理する。
+        """
+        remaining = self._remaining_targets(targets) if self.stream else None
+        if remaining is not None and not remaining:
+            return list(files)
+
+        discovered = []
+        jobs = max(1, max_workers or os.cpu_count() or 1)
+        with _run_stats.stage('scan'):
+            files_to_scan = self._iter_files_to_scan(files, discovered, remaining)
+            if isinstance(files, (list, tuple)):
+                # 一覧が分かっている場合はキャッシュを先に読み、残りをサイズ順にバッチにまとめる
+                files_to_scan = list(files_to_scan)
+            self._scan_files(files_to_scan, jobs, remaining)
+        return discovered
+
+
+    def remove_subtitle_files(self, files):
+        # 削除されたファイルの結果を集計・インデックスから取り除く
+        revived = self._forget_files(files)
+        if self.index is not None:
+            for file in files:
+                self.index.remove_file(file)
+            self.index.commit()
+        # 削除されたファイルの重複としてスキップしていたファイルを処理し直す
+        if revived:
+            self.update_subtitle_files(revived)
+
+
+    def set_anki_kanji_dict(self, anki_kanji_dict):
+        # Ankiの漢字カウントを差し替える（インデックスにも反映する）
+        self.anki_kanji_dict = anki_kanji_dict
+        if self.index is not None:
+            self.index.set_anki_counts(anki_kanji_dict)
+            self.index.commit()
 
-        batches = [files[i:i + self.batch_size] for i in range(0, len(files), self.batch_size)]
 
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            future_to_batch = {executor.submit(self._process_batch, batch): batch for batch in batches}
-            
-            file_iterator = tqdm(as_completed(future_to_batch), total=len(batches), desc="字幕処理中", unit="バッチ") if use_progress_bar else as_completed(future_to_batch)
+    def set_anki_words(self, anki_words):
+        # 語彙モードで単語がAnkiにあるかを判定するため、Ankiの単語を正規化して保持する
+        deck_text = KanjiUtils.ANKI_MARKUP_RE.sub('', KanjiUtils.WORD_SEPARATOR.join(anki_words))
+        self.anki_words = set(map(KanjiUtils.normalize_text, deck_text.split(KanjiUtils.WORD_SEPARATOR)))
 
-            for future in file_iterator:
-                result = future.result()
-                for kanji, occurrences in result.items():
-                    self.kanji_timestamps[kanji].extend(occurrences)
 
+    def _kanken_level_name(self, kanji):
+        # 漢字の漢検レベル名を返す（コードポイント表を1回引くだけで済む）
+        return KanjiUtils.LEVEL_NAMES[KanjiUtils.get_kanken_level(kanji)]
 
-    def _format_kanji_info_pdf(self, kanji, occurrences):
+
+    @staticmethod
+    @functools.lru_cache(maxsize=65536)
+    def _format_timestamp(ms):
+        return _lazy_import('pysubs2.time').ms_to_str(ms)
+
+
+    def _format_kanji_info_pdf(self, kanji):
         # 漢字情報を整形するヘルパー関数
-        kanken_level = (
-            "準一級" if kanji in self.kanken_j1k_set else
-            "準一級／一級" if kanji in self.kanken_j1k1k_set else
-            "一級"
-        )
+        kanken_level = self._kanken_level_name(kanji)
 
         anki_count = self.anki_kanji_dict.get(kanji, 0)
         info = f"<b><font color='purple'>{kanji}</font></b>, レベル: <font color='seagreen'>{kanken_level}</font>"
         if anki_count > 0:
             info += f", Ankiカード数: {anki_count}枚"
+        info += f", 出現回数: {self.occurrences.count(kanji)}回"
 
         occurrences_text = ""
-        for file, ts, sentence in occurrences[:10]:
-            cleaned_sentence = KanjiUtils.clean_text(sentence).replace(kanji, f"<font color='purple'>{kanji}</font>")
+        for file, ts, sentence in self.occurrences.examples(kanji):
+            # ParagraphのマークアップとしてHTML特殊文字をエスケープしてから色を付ける
+            cleaned_sentence = xml_escape(KanjiUtils.clean_text(sentence)).replace(kanji, f"<font color='purple'>{kanji}</font>")
             occurrences_text += (
-                f"<font color='darkgray'><br/><b>{FileUtils.clean_filename(os.path.basename(file))}</b> </font>"
-                f"<font color='steelblue'>({pysubs2.time.ms_to_str(ts)})</font> - {cleaned_sentence}"
+                f"<font color='darkgray'><br/><b>{xml_escape(FileUtils.display_filename(file))}</b> </font>"
+                f"<font color='steelblue'>({KankenSubtitleProcessor._format_timestamp(ts)})</font> - {cleaned_sentence}"
             )
 
         return f"{info}<br/>{occurrences_text}<br/><br/>"
     
 
-    def _print_kanji_info_console(self, kanji, occurrences):
+    def _print_kanji_info_console(self, kanji):
         purple = "\033[35m"  # 漢字
         cyan = "\033[36m"    # タイムスタンプ
         orange = "\033[38;5;208m"   # 漢検レベル
@@ -251,67 +2031,112 @@ class KankenSubtitleProcessor:
 
         formatted_occurrences = "".join(
             (
-                f"\n{green}{FileUtils.clean_filename(os.path.basename(file))}{reset} "
-                f"({cyan}{pysubs2.time.ms_to_str(ts)}{reset}) - "
+                f"\n{green}{FileUtils.display_filename(file)}{reset} "
+                f"({cyan}{KankenSubtitleProcessor._format_timestamp(ts)}{reset}) - "
                 f"{KanjiUtils.clean_text(sentence).replace(kanji, f'{purple}{kanji}{reset}')}"
             )
-            for file, ts, sentence in occurrences[:10]
-        )
-        kanken_level = (
-            f"{orange}準一級{reset}" if kanji in self.kanken_j1k_set else
-            f"{orange}準一級／一級{reset}" if kanji in self.kanken_j1k1k_set else
-            f"{orange}一級{reset}"
+            for file, ts, sentence in self.occurrences.examples(kanji)
         )
+        kanken_level = f"{orange}{self._kanken_level_name(kanji)}{reset}"
 
         anki_count = self.anki_kanji_dict.get(kanji, 0)
         purple_kanji = f"{purple}{kanji}{reset}"
+        count = self.occurrences.count(kanji)
         if anki_count > 0:
-            print(f"漢字: {purple_kanji}, レベル: {kanken_level}, Ankiカード数: {anki_count}枚, 出現箇所:{formatted_occurrences}\n")
+            print(f"漢字: {purple_kanji}, レベル: {kanken_level}, Ankiカード数: {anki_count}枚, 出現回数: {count}回, 出現箇所:{formatted_occurrences}\n")
         else:
-            print(f"漢字: {purple_kanji}, レベル: {kanken_level}, 出現箇所:{formatted_occurrences}\n")
+            print(f"漢字: {purple_kanji}, レベル: {kanken_level}, 出現回数: {count}回, 出現箇所:{formatted_occurrences}\n")
 
 
-    def print_kanji_summary(self, nbr_of_allowed_existing_cards=1, export_path="kanji_summary.pdf"):
-        # 漢字の出現要約を表示またはエクスポート
-        subtitle_kanji_set = set(self.kanji_timestamps.keys())
-        kk_kanji_to_print = {
+    def kanji_to_print(self, nbr_of_allowed_existing_cards=1):
+        # 字幕に出現し、Ankiカード数が許容数以下の漢検漢字を返す
+        subtitle_kanji_set = set(self.occurrences.keys())
+        return {
             kanji for kanji in subtitle_kanji_set & self.total_kanken_set
             if self.anki_kanji_dict.get(kanji, 0) <= nbr_of_allowed_existing_cards
         }
 
+
+    def _group_kanji_for_pdf(self, kanji_list, pdf_split):
+        # PDFの分割単位ごとに漢字をまとめる {名前: [漢字, ...]}（順序は保つ）
+        if pdf_split == 'none':
+            return {"": kanji_list}
+
+        groups = {}
+        for kanji in kanji_list:
+            if pdf_split == 'level':
+                name = self._kanken_level_name(kanji)
+            else:
+                # 最初の用例のシリーズに振り分ける
+                examples = self.occurrences.examples(kanji)
+                name = FileUtils.series_name(examples[0][0]) if examples else ""
+            groups.setdefault(name, []).append(kanji)
+
+        if pdf_split == 'level':
+            level_order = list(KanjiUtils.LEVEL_NAMES.values())
+            return dict(sorted(groups.items(), key=lambda group: level_order.index(group[0])))
+        return dict(sorted(groups.items()))
+
+
+    def print_kanji_summary(self, nbr_of_allowed_existing_cards=1, export_path="kanji_summary.pdf", pdf_split='none', max_workers=None):
+        # 漢字の出現要約を表示またはエクスポート
+        kk_kanji_to_print = self.kanji_to_print(nbr_of_allowed_existing_cards)
+
         if self.export:
-            doc = SimpleDocTemplate(export_path, pagesize=A4)
-            styles = getSampleStyleSheet()
-            kanji_style = ParagraphStyle("KanjiStyle", parent=styles["BodyText"], fontName="NotoSansJP", fontSize=12)
-            title_style = ParagraphStyle("TitleStyle", parent=styles["Title"], fontName="NotoSansJP", fontSize=16, spaceAfter=12)
-            content = [Paragraph(f"見つかった漢字: {len(kk_kanji_to_print)}字（準一級／一級 レベル）", title_style), Spacer(1, 12)]
-
-            for kanji in sorted(kk_kanji_to_print, key=lambda k: self.kanji_timestamps[k][0][1]):
-                content.append(Paragraph(self._format_kanji_info_pdf(kanji, self.kanji_timestamps[kanji]), kanji_style))
-                content.append(Spacer(1, 12))
-
-            doc.build(content)
-            print(f"漢字の要約を {export_path} にエクスポートしました。")
+            kanji_list = sorted(kk_kanji_to_print, key=self.occurrences.first_start)
+            documents = []
+            for name, group in self._group_kanji_for_pdf(kanji_list, pdf_split).items():
+                scope = xml_escape(name) if name else "準一級／一級 レベル"
+                title = f"見つかった漢字: {len(group)}字（{scope}）"
+                documents.append((name, title, [self._format_kanji_info_pdf(kanji) for kanji in group]))
+
+            with _run_stats.stage('pdf'):
+                for path in KanjiPdfExporter(max_workers).export(export_path, documents):
+                    print(f"漢字の要約を {path} にエクスポートしました。")
         else:
             print(f"見つかった漢字: {len(kk_kanji_to_print)}字（準一級／一級 レベル）\n")
-            for kanji in sorted(kk_kanji_to_print, key=lambda k: self.kanji_timestamps[k][0][1]):
-                self._print_kanji_info_console(kanji, self.kanji_timestamps[kanji])
+            for kanji in sorted(kk_kanji_to_print, key=self.occurrences.first_start):
+                self._print_kanji_info_console(kanji)
+
+
+    def print_vocabulary_summary(self):
+        # 語彙モード: 字幕に出現した語彙の単語を、Ankiにない単語を先に出現順で表示する
+        if self.word_occurrences is None:
+            return
+        purple = "\033[35m"  # 単語
+        cyan = "\033[36m"    # タイムスタンプ
+        green = "\033[97m"   # 文
+        reset = "\033[0m"
+
+        words = sorted(self.word_occurrences, key=lambda word: (word in self.anki_words, self.word_occurrences.first_start(word)))
+        new_words = sum(1 for word in words if word not in self.anki_words)
+        print(f"\n見つかった語彙: {len(words)}語（Ankiにない単語: {new_words}語）\n")
+        for word in words:
+            formatted_occurrences = "".join(
+                (
+                    f"\n{green}{FileUtils.display_filename(file)}{reset} "
+                    f"({cyan}{KankenSubtitleProcessor._format_timestamp(ts)}{reset}) - "
+                    f"{KanjiUtils.clean_text(sentence).replace(word, f'{purple}{word}{reset}')}"
+                )
+                for file, ts, sentence in self.word_occurrences.examples(word)
+            )
+            anki = "登録済み" if word in self.anki_words else "未登録"
+            print(f"単語: {purple}{word}{reset}, Anki: {anki}, 出現回数: {self.word_occurrences.count(word)}回, 出現箇所:{formatted_occurrences}\n")
 
 
     def print_progress(self):
         print("\n----- 現在の進捗状況 -----")
-        levels = [
-            (self.kanken_j1k_set, "準一級"),
-            (self.kanken_j1k1k_set, "準一級／一級"),
-            (self.kanken_1k_set, "一級")
-        ]
 
-        for kanken_kanji_set, level_name in levels:
-            current_kanji_in_anki = len(set(self.anki_kanji_dict.keys()) & kanken_kanji_set)
-            total_kanji = len(kanken_kanji_set)
+        # Ankiと字幕の漢字をレベルごとに一度だけ分類しておく
+        anki_coverage = KanjiUtils.coverage_by_level(self.anki_kanji_dict.keys())
+        subtitle_kanji_by_level = KanjiUtils.group_by_level(self.occurrences.keys())
+
+        for level, (anki_kanji_in_group, total_kanji) in anki_coverage.items():
+            level_name = KanjiUtils.LEVEL_NAMES[level]
+            current_kanji_in_anki = len(anki_kanji_in_group)
 
             # 字幕から追加可能な漢字
-            subtitle_kanji_in_group = (set(self.kanji_timestamps.keys()) & kanken_kanji_set) - (set(self.anki_kanji_dict.keys()) & kanken_kanji_set)
+            subtitle_kanji_in_group = subtitle_kanji_by_level[level] - anki_kanji_in_group
             projected_progress = current_kanji_in_anki + len(subtitle_kanji_in_group)
             project_progress_percentage = (projected_progress / total_kanji) * 100 if total_kanji > 0 else 0
 
@@ -324,22 +2149,244 @@ class KankenSubtitleProcessor:
                 print(f"字幕から追加可能な漢字: {len(subtitle_kanji_in_group)}、 {projected_progress} / {total_kanji} ({project_progress_percentage:.2f}%) 完了予定\n")
 
 
+    def print_duplicates(self, limit=20):
+        # 重複としてスキップしたファイルを、どのファイルの重複かと一緒に表示する（最大 limit 件）
+        if self.deduplicator is None or not self.deduplicator.duplicates:
+            return
+        duplicates = sorted(self.deduplicator.duplicates.items(), key=lambda item: (FileUtils.sort_key(item[0]), item[0]))
+        print(f"\n重複のためスキップしたファイル: {len(duplicates)}件（--keep-duplicates ですべて処理します）")
+        for file, (kept, similarity) in duplicates[:limit]:
+            reason = "同一内容" if similarity is None else f"テキスト一致率 {similarity:.0%}"
+            print(f"  {file}\n    → {kept} ({reason})")
+        if len(duplicates) > limit:
+            print(f"  ほか {len(duplicates) - limit}件")
+
+
+class KanjiPdfExporter:
+    """
+    整形済みの漢字情報（Paragraphのマークアップ）からPDFを作成するクラス。
+    複数のPDFに分割する場合は、ワーカープロセスで並列に作成する（フォントはプロセスごとに一度だけ登録）。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+    @staticmethod
+    def output_path(export_path, name):
+        # 分割したPDFのファイル名（例: kanji_summary_準一級.pdf）
+        if not name:
+            return export_path
+        base, ext = os.path.splitext(export_path)
+        safe_name = re.sub(r'[\\/:*?"<>|\s]+', '_', name).strip('_')
+        return f"{base}_{safe_name}{ext or '.pdf'}"
+
+    @staticmethod
+    def build(export_path, title, entries):
+        # 1つのPDFを作成する
+        register_pdf_font(_registered_font_path)
+        platypus = _lazy_import('reportlab.platypus')
+        styles_module = _lazy_import('reportlab.lib.styles')
+
+        doc = platypus.SimpleDocTemplate(export_path, pagesize=_lazy_import('reportlab.lib.pagesizes').A4)
+        styles = styles_module.getSampleStyleSheet()
+        kanji_style = styles_module.ParagraphStyle("KanjiStyle", parent=styles["BodyText"], fontName=font_name, fontSize=12)
+        title_style = styles_module.ParagraphStyle("TitleStyle", parent=styles["Title"], fontName=font_name, fontSize=16, spaceAfter=12)
+        content = [platypus.Paragraph(title, title_style), platypus.Spacer(1, 12)]
+
+        for entry in entries:
+            content.append(platypus.Paragraph(entry, kanji_style))
+            content.append(platypus.Spacer(1, 12))
+
+        doc.build(content)
+        return export_path
+
+    def export(self, export_path, documents):
+        """
+        documents: [(名前, タイトル, [マークアップ, ...]), ...]。名前が空でなければファイル名に付ける。
+        作成したPDFのパスを完了した順に返す。
+        """
+        register_pdf_font()
+        jobs = [(KanjiPdfExporter.output_path(export_path, name), title, entries) for name, title, entries in documents]
+        processes = max(1, min(self.max_workers or os.cpu_count() or 1, len(jobs)))
+
+        if processes == 1:
+            for job in jobs:
+                yield KanjiPdfExporter.build(*job)
+            return
+
+        with _lazy_import('multiprocessing').Pool(processes=processes, initializer=register_pdf_font, initargs=(_registered_font_path,)) as pool:
+            yield from pool.imap_unordered(_build_pdf_worker, jobs)
+
+
+class SubtitleWatcher:
+    """
+    対象ディレクトリを定期的にポーリングし、新規・変更された字幕ファイルだけを再処理する常駐モード。
+    集計結果はプロセッサーにメモリ上で保持し、変更があるたびに新しく見つかった未習得の漢検漢字を表示する。
+    """
+
+    def __init__(self, processor, target, extensions, interval=60, max_workers=None, anki_loader=None, nbr_of_allowed_existing_cards=0, pdf_split='none'):
+        self.processor = processor
+        self.target = target
+        self.extensions = extensions
+        self.interval = interval
+        self.max_workers = max_workers
+        self.anki_loader = anki_loader  # Ankiの漢字カウントを再取得する関数（Noneなら再取得しない）
+        self.nbr_of_allowed_existing_cards = nbr_of_allowed_existing_cards
+        self.pdf_split = pdf_split
+        self.snapshot = {}
+
+    def _snapshot(self, files=None):
+        # ファイルごとの (mtime, サイズ) を取得する
+        snapshot = {}
+        for file in files if files is not None else FileUtils.iter_files(self.target, self.extensions):
+            try:
+                snapshot[file] = FileUtils.stat(file)
+            except OSError:
+                continue
+        return snapshot
+
+    def start(self, files=None):
+        # 処理済みのファイルを基準として記録する
+        self.snapshot = self._snapshot(files)
+
+    def poll(self):
+        """
+        1回分のポーリングを行い、新しく見つかった未習得の漢検漢字を返す。
+        変更がなければ何も表示せずに空のセットを返す。
+        """
+        snapshot = self._snapshot()
+        changed = [file for file, signature in snapshot.items() if self.snapshot.get(file) != signature]
+        deleted = [file for file in self.snapshot if file not in snapshot]
+        self.snapshot = snapshot
+        if not changed and not deleted:
+            return set()
+
+        if self.anki_loader is not None:
+            self.processor.set_anki_kanji_dict(self.anki_loader())
+        known_kanji = self.processor.kanji_to_print(self.nbr_of_allowed_existing_cards)
+
+        self.processor.remove_subtitle_files(deleted)
+        if changed:
+            self.processor.update_subtitle_files(changed, max_workers=self.max_workers)
+
+        new_kanji = self.processor.kanji_to_print(self.nbr_of_allowed_existing_cards) - known_kanji
+        self._report(changed, deleted, new_kanji)
+        return new_kanji
+
+    def _report(self, changed, deleted, new_kanji):
+        print(f"\n===== {time.strftime('%Y-%m-%d %H:%M:%S')} 追加・変更: {len(changed)}、削除: {len(deleted)} =====")
+        print(f"新しく見つかった漢字: {len(new_kanji)}字\n")
+        for kanji in sorted(new_kanji, key=self.processor.occurrences.first_start):
+            self.processor._print_kanji_info_console(kanji)
+        if self.processor.export and new_kanji:
+            self.processor.print_kanji_summary(nbr_of_allowed_existing_cards=self.nbr_of_allowed_existing_cards, pdf_split=self.pdf_split, max_workers=self.max_workers)
+        self.processor.print_progress()
+
+    def run(self):
+        print(f"'{self.target}' を監視しています（{self.interval}秒ごと）。Ctrl+Cで終了します。")
+        try:
+            while True:
+                time.sleep(self.interval)
+                self.poll()
+        except KeyboardInterrupt:
+            print("\n監視を終了しました。")
+
+
+# ワーカープロセスごとの設定（_init_scan_worker で初期化される）
+_worker_verbose = False
+_worker_max_examples = 10
+_worker_fingerprint = True
+_worker_vocabulary = None
+
+
+def _init_scan_worker(verbose, max_examples, fingerprint=True, vocabulary=None):
+    # ワーカープロセスの初期化。漢検漢字テーブルと語彙のオートマトンはプロセスごとに一度だけ構築する
+    # （fork で起動した場合は親プロセスで構築済みのものをそのまま使う）
+    global _worker_verbose, _worker_max_examples, _worker_fingerprint, _worker_vocabulary
+    _worker_verbose = verbose
+    _worker_max_examples = max_examples
+    _worker_fingerprint = fingerprint
+    _worker_vocabulary = vocabulary
+    KanjiUtils.load_kanken_scan_table()
+    if vocabulary:
+        VocabularyMatcher.load(vocabulary)
+    # 親プロセスから引き継いだアーカイブのファイルオブジェクトは、読み込み位置を共有してしまうので使わない
+    ArchiveUtils._open_archive.cache_clear()
+
+
+def _scan_batch_worker(files):
+    _run_stats.reset()
+    result = KankenSubtitleProcessor._process_batch(files, _worker_verbose, _worker_max_examples, _worker_fingerprint, _worker_vocabulary)
+    return result, _run_stats.snapshot()
+
+
+def _scan_files_worker(files):
+    _run_stats.reset()
+    result = [KankenSubtitleProcessor._scan_file_streaming(file, _worker_verbose, _worker_fingerprint, _worker_vocabulary) for file in files]
+    return result, _run_stats.snapshot()
+
+
+def _build_pdf_worker(job):
+    return KanjiPdfExporter.build(*job)
+
+
+class AnkiUnavailableError(Exception):
+    # AnkiConnectに接続できない場合の例外
+    pass
+
+
 # 妹ジャックから貰ったコード
 class AnkiHandler():
 
-    def __init__(self, url='http://127.0.0.1:8765'):
+    CACHE_FILE = os.path.join(os.path.dirname(__file__), 'anki_cache.json')
+    NOTES_INFO_CHUNK_SIZE = 500
+
+    def __init__(self, url='http://127.0.0.1:8765', cache_file=None, offline=False):
         self.url = url
+        parsed_url = _lazy_import('urllib.parse').urlsplit(url)
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port or 80
+        self.path = parsed_url.path or '/'
+        self.cache_file = cache_file or AnkiHandler.CACHE_FILE
+        self.offline = offline
+        self._connection = None
 
     def _request(self, action, **params):
         return { 'action': action, 'params': params, 'version': 6 }
 
+    def _post(self, body):
+        # keep-alive接続でリクエストを送る。再利用した接続が切れていた場合は一度だけ接続し直す
+        while True:
+            reused = self._connection is not None
+            if not reused:
+                self._connection = _lazy_import('http.client').HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self._connection.request('POST', self.path, body, {'Content-Type': 'application/json'})
+                response = self._connection.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.close()
+                return json.loads(data)
+            except (_lazy_import('http.client').HTTPException, OSError):
+                self.close()
+                if not reused:
+                    raise
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
     def _invoke(self, action, **params):
+        request_json = json.dumps(self._request(action, **params)).encode('utf-8')
         try:
-            request_json = json.dumps(self._request(action, **params)).encode('utf-8')
-
-            with urllib.request.urlopen(urllib.request.Request(self.url, request_json)) as url:
-                response = json.load(url)
+            _run_stats.counters['anki_requests'] += 1
+            with _run_stats.stage('anki'):
+                response = self._post(request_json)
+        except (_lazy_import('http.client').HTTPException, OSError) as e:
+            raise AnkiUnavailableError(str(e)) from e
 
+        try:
             if len(response) != 2:
                 raise Exception('The response has an unexpected number of fields.')
             if 'error' not in response:
@@ -351,39 +2398,150 @@ class AnkiHandler():
 
             return response['result']
 
-        except socket.error:
-            print("Ankiが実行されていないようです。Ankiを起動して再試行してください。")
-            sys.exit()
-            return None
         except Exception as e:
             print(f"エラーが発生しました: {e}")
             sys.exit()
             return None
 
+    def _load_cache(self):
+        # ノートのキャッシュ {検索条件: {'synced_at': 時刻, 'notes': {ノートID: [単語, 更新時刻]}}} を読み込む
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError):
+                print(f"Warning: {self.cache_file} is empty or corrupted.")
+        return {}
+
+    def _save_cache(self, cache):
+        temp_file = f"{self.cache_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, self.cache_file)
+
+    def _sync_notes(self, deck, search_query, word_field, entry):
+        """
+        キャッシュを最新の状態にして返す。
+        前回の同期以降に編集・追加されたノートだけを notesInfo で分割して取得する。
+        フィールドが見つからない場合はNoneを返す。
+        """
+        synced_at = time.time()
+        note_ids = self._invoke('findNotes', query=search_query)
+        if not note_ids:
+            print(f'デッキ「{deck}」にはカードが見つかりませんでした。')
+            return {'synced_at': synced_at, 'notes': {}}
+
+        cached_notes = entry['notes'] if entry else {}
+        if cached_notes:
+            # edited:n は日単位なので、取りこぼしがないよう1日余分に遡る
+            days = math.ceil((synced_at - entry['synced_at']) / 86400) + 1
+            edited_ids = set(self._invoke('findNotes', query=f'{search_query} edited:{days}'))
+            changed_ids = [note_id for note_id in note_ids if note_id in edited_ids or str(note_id) not in cached_notes]
+        else:
+            changed_ids = note_ids
+
+        notes = {str(note_id): cached_notes[str(note_id)] for note_id in note_ids if str(note_id) in cached_notes}
+        for start in range(0, len(changed_ids), AnkiHandler.NOTES_INFO_CHUNK_SIZE):
+            infos = self._invoke('notesInfo', notes=changed_ids[start:start + AnkiHandler.NOTES_INFO_CHUNK_SIZE])
+            if start == 0 and infos and word_field not in infos[0]['fields']:
+                print(f'⚠️ フィールド「{word_field}」が見つかりません。')
+                return None
+            for info in infos:
+                if word_field in info['fields']:
+                    notes[str(info['noteId'])] = [info['fields'][word_field]['value'], info.get('mod', 0)]
+
+        if cached_notes:
+            print(f'デッキ「{deck}」の変更されたノート {len(changed_ids)}件を取得しました。')
+        return {'synced_at': synced_at, 'notes': notes}
+
     def get_words_in_deck(self, deck, word_field, ignore_existing_cards_without_audio=False):
         if ignore_existing_cards_without_audio:
             search_query = f'"deck:{deck}" KankenAudio:_*'
         else:
             search_query = f'deck:"{deck}"'
 
-        note_ids = self._invoke('findNotes', query=search_query)
-        if not note_ids:
-            print(f'デッキ「{deck}」にはカードが見つかりませんでした。')
-            return []
+        cache = self._load_cache()
+        cache_key = f"{search_query}\n{word_field}"
+        entry = cache.get(cache_key)
 
-        notes = self._invoke('notesInfo', notes=note_ids)
-        if notes and word_field not in notes[0]['fields']:
-            print(f'⚠️ フィールド「{word_field}」が見つかりません。')
+        if not self.offline:
+            try:
+                entry = self._sync_notes(deck, search_query, word_field, entry)
+            except AnkiUnavailableError:
+                if entry is None:
+                    print("Ankiが実行されていないようです。Ankiを起動して再試行してください。")
+                    sys.exit()
+                print("Ankiに接続できないため、前回取得した単語を使用します。")
+            else:
+                if entry is None:
+                    return []
+                cache[cache_key] = entry
+                self._save_cache(cache)
+            finally:
+                self.close()
+        elif entry is None:
+            print(f'デッキ「{deck}」のキャッシュがありません。一度Ankiを起動した状態で実行してください。')
             return []
 
-        words = [note['fields'][word_field]['value'] + '\n' for note in notes]
+        words = [value + '\n' for value, _ in entry['notes'].values()]
         
         print(f'デッキ「{deck}」から {len(words)}個の単語を取得しました。')
         return words
 
 
+def query_main(argv):
+    # インデックスから漢字の出現箇所・頻度を検索する（字幕ファイルは読み込まない）
+    parser = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} query", description="漢字インデックスを検索します（事前に --index を付けてスキャンしてください）")
+    parser.add_argument("kanji", type=str, nargs='?', help='検索する漢字（複数指定可）')
+    parser.add_argument("--top", type=int, default=None, metavar='K', help='出現回数の多い漢字を上位K件表示します')
+    parser.add_argument("--not-in-anki", action='store_true', help='（--top）Ankiにカードがない漢字だけを表示します')
+    parser.add_argument("--limit", type=int, default=10, help='漢字ごとに表示する用例の最大数（デフォルト: 10）')
+    parser.add_argument("--index", type=str, default=KanjiIndex.INDEX_FILE, help=f'インデックスファイル（デフォルト: {KanjiIndex.INDEX_FILE}）')
+    args = parser.parse_args(argv)
+
+    if not args.kanji and args.top is None:
+        parser.error("漢字または --top を指定してください")
+    if not os.path.exists(args.index):
+        parser.error(f"インデックス '{args.index}' が見つかりません。先に --index を付けてスキャンしてください")
+
+    index = KanjiIndex(args.index)
+    started = time.perf_counter()
+    try:
+        if args.top is not None:
+            for rank, (kanji, level, count, anki_count) in enumerate(index.top(args.top, not_in_anki=args.not_in_anki), 1):
+                print(f"{rank:>4}. 漢字: {kanji}, レベル: {KanjiUtils.LEVEL_NAMES[level]}, Ankiカード数: {anki_count}枚, 出現回数: {count}回")
+
+        for kanji in dict.fromkeys(char for char in args.kanji or '' if not char.isspace()):
+            if not KanjiUtils.extract_kanken_kanji(kanji):
+                # インデックスには漢検準一級・一級の漢字しか入っていない
+                print(f"漢字: {kanji}, 漢検準一級・一級の漢字ではないため検索できません\n")
+                continue
+            result = index.lookup(kanji, limit=args.limit)
+            if result is None:
+                print(f"漢字: {kanji}, インデックスに出現箇所がありません\n")
+                continue
+            series = "、".join(f"{name} ({count}回)" for name, count in result['series'])
+            examples = "".join(
+                f"\n{FileUtils.display_filename(file)} ({KankenSubtitleProcessor._format_timestamp(ts)}) - {KanjiUtils.clean_text(sentence)}"
+                for file, ts, sentence in result['examples']
+            )
+            print(f"漢字: {kanji}, レベル: {KanjiUtils.LEVEL_NAMES[result['level']]}, Ankiカード数: {result['anki_count']}枚, 出現回数: {result['count']}回")
+            print(f"シリーズ: {series}")
+            print(f"出現箇所:{examples}\n")
+    finally:
+        index.close()
+    print(f"検索時間: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
 def main():
     # 字幕ファイルを処理してユニークな漢字を抽出する
+    global _main_started
+    _main_started = time.perf_counter()
+
+    if sys.argv[1:2] == ['query']:
+        query_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="字幕ファイルから漢検準一級／一級の漢字を抽出します")
     parser.add_argument("target", type=str, help="処理する対象ディレクトリまたはファイル")
 
@@ -400,25 +2558,119 @@ def main():
     parser.add_argument('--word', type=str, required=word_required, help='単語を含むフィールド名')
     parser.add_argument("-ia", action='store_true', help='Ankiカードが既に存在していても、音声がない場合は、字幕に出現する漢字を表示します')
     parser.add_argument("-e", action='store_true')
+    parser.add_argument("-j", "--jobs", type=int, default=None, help='並列処理するプロセス数（デフォルト: CPUコア数）')
+    parser.add_argument("--max-examples", type=int, default=10, help='漢字ごとに保持・表示する用例の最大数（デフォルト: 10）')
+    parser.add_argument("--stream", action='store_true', help='軽量トークナイザーで1ファイルずつ処理し、メモリ使用量を一定に保ちます（重複は内容が同一のファイルだけを判定します）')
+    parser.add_argument("--early-stop", action='store_true', help='（--stream）未習得の漢字すべての用例が揃った時点でスキャンを終了します')
+    parser.add_argument("--targets", type=str, default=None, metavar='KANJI|PATH', help='--early-stop の対象にする漢字（文字列、または漢字を書いたファイルのパス）。指定すると --early-stop を含みます')
+    parser.add_argument("--watch", action='store_true', help='処理後も対象ディレクトリを監視し、新規・変更された字幕ファイルだけを処理します')
+    parser.add_argument("--interval", type=float, default=60, help='--watch のポーリング間隔（秒、デフォルト: 60）')
+    parser.add_argument("--offline", action='store_true', help='Ankiに接続せず、前回取得した単語を使用します')
+    parser.add_argument("--anki-url", type=str, default='http://127.0.0.1:8765', help='AnkiConnectのURL（デフォルト: http://127.0.0.1:8765）')
+    parser.add_argument("--pdf-split", choices=['none', 'level', 'series'], default='none', help='（-e）PDFをレベル別・シリーズ別に分割し、並列で作成します')
+    parser.add_argument("--font", type=str, default=None, help=f'（-e）PDFに使用するTTFフォント（デフォルト: {font_path}）。サブセット化した静的フォントを指定すると高速になります')
+    parser.add_argument("--profile-startup", action='store_true', help='起動時間とモジュールの読み込み時間を表示します')
+    parser.add_argument("--vocab", type=str, default=None, metavar='PATH', help='語彙リスト（1行1単語）の熟語が字幕に出現する箇所も表示します（字幕を読み直すため、キャッシュは使われません）')
+    parser.add_argument("--keep-duplicates", action='store_true', help='内容が同じ・ほぼ同じ字幕ファイル（リリース違いなど）もスキップせずに処理します')
+    parser.add_argument("--no-cache", action='store_true', help='スキャン結果のキャッシュを使用しません')
+    parser.add_argument("--rebuild-cache", action='store_true', help='キャッシュを破棄してすべての字幕ファイルを再スキャンします')
+    parser.add_argument("--prune-cache", action='store_true', help='削除されたファイルのエントリをキャッシュから取り除きます')
+    parser.add_argument("--index", type=str, nargs='?', const=KanjiIndex.INDEX_FILE, default=None, help=f'スキャン結果を漢字インデックスに保存し、"query" で検索できるようにします（デフォルト: {KanjiIndex.INDEX_FILE}）')
+    parser.add_argument("--rebuild-index", action='store_true', help='（--index）インデックスを破棄して作り直します')
+    parser.add_argument("--stats", action='store_true', help='処理段階ごとの実時間・CPU時間とカウンターを最後に表示します')
+    parser.add_argument("--stats-json", type=str, default=None, metavar='PATH', help='処理統計をJSONで書き出します（"-"で標準出力）')
+    parser.add_argument("--profile", type=str, default=None, metavar='PATH', help='字幕処理と要約作成をcProfileで計測し、pstats形式で保存します（-j 1 でワーカーの処理も計測できます）')
     args = parser.parse_args()
 
+    if args.max_examples < 1:
+        # 保存された設定の値もここで弾く
+        parser.error("--max-examples には1以上を指定してください")
+
+    target_kanji = None
+    if args.targets:
+        # ファイルのパスならその内容、それ以外は引数の文字列に含まれる漢検漢字を対象にする
+        text = args.targets
+        if os.path.isfile(text):
+            with open(text, 'r', encoding='utf-8-sig') as f:
+                text = f.read()
+        target_kanji = set(KanjiUtils.extract_kanken_kanji(text))
+        if not target_kanji:
+            parser.error("--targets に漢検準一級・一級の漢字が含まれていません")
+        args.early_stop = True
+
+    if args.e:
+        # 長いスキャンの後で失敗しないよう、フォントは先に登録しておく
+        register_pdf_font(args.font)
+
+    if args.vocab:
+        # オートマトンはワーカーを起動する前に構築しておき、各ワーカーで使い回す
+        try:
+            print(f"語彙リスト: {len(VocabularyMatcher.load(args.vocab).words)}語")
+        except OSError as e:
+            parser.error(f"語彙リスト '{args.vocab}' を読み込めません: {e}")
+
     kanken_kanken_j1k_set, kanken_kanken_j1k1k_set, kanken_1k_set = KanjiUtils.load_kanken_kanji_sets()
 
-    anki_handler = AnkiHandler()
+    anki_handler = AnkiHandler(args.anki_url, offline=args.offline)
     words = anki_handler.get_words_in_deck(args.deck, args.word, ignore_existing_cards_without_audio=args.ia)
     anki_kanji_occurrences = KanjiUtils.count_kanji_in_words(words, kanken_kanken_j1k_set, kanken_kanken_j1k1k_set, kanken_1k_set)
 
-    kanken_sub_handler = KankenSubtitleProcessor(kanken_kanken_j1k_set, kanken_kanken_j1k1k_set, kanken_1k_set, anki_kanji_occurrences, export=args.e)
-
-    files = FileUtils.get_files(args.target, ['.srt', '.ass'])
-    if not files:
+    def load_anki_kanji_occurrences():
+        # 監視モードでAnkiの漢字カウントを最新にする
+        words = anki_handler.get_words_in_deck(args.deck, args.word, ignore_existing_cards_without_audio=args.ia)
+        kanken_sub_handler.set_anki_words(words)
+        return KanjiUtils.count_kanji_in_words(words, kanken_kanken_j1k_set, kanken_kanken_j1k1k_set, kanken_1k_set)
+
+    scan_cache = None
+    if not args.no_cache:
+        scan_cache = ScanCache(rebuild=args.rebuild_cache)
+        if args.prune_cache:
+            print(f"キャッシュから {scan_cache.prune()}件の削除済みファイルを取り除きました。")
+
+    kanji_index = None
+    if args.index:
+        kanji_index = KanjiIndex(args.index, rebuild=args.rebuild_index)
+        kanji_index.prune()
+
+    kanken_sub_handler = KankenSubtitleProcessor(kanken_kanken_j1k_set, kanken_kanken_j1k1k_set, kanken_1k_set, anki_kanji_occurrences, export=args.e, cache=scan_cache, max_examples=args.max_examples, stream=(args.stream or args.early_stop) and not args.watch, index=kanji_index, dedupe=not args.keep_duplicates, vocabulary=args.vocab, anki_words=words)
+    kanken_sub_handler.set_anki_kanji_dict(anki_kanji_occurrences)
+
+    extensions = FileUtils.SUBTITLE_EXTENSIONS
+    targets = target_kanji
+    if args.early_stop and targets is None:
+        targets = {kanji for kanji in kanken_sub_handler.total_kanken_set if anki_kanji_occurrences.get(kanji, 0) <= 0}
+
+    profiler = None
+    if args.profile:
+        profiler = _lazy_import('cProfile').Profile()
+        profiler.enable()
+
+    # ファイルの探索と並行して処理を始める
+    files = kanken_sub_handler.process_subtitle_files(FileUtils.iter_files(args.target, extensions), max_workers=args.jobs, targets=targets)
+    _run_stats.counters['files_found'] = len(files)
+    if not files and not args.watch:
         print(f"フォルダ '{args.target}' には字幕ファイルが見つかりませんでした")
         return
     print(f"見つかったファイル: {len(files)}")
-
-    kanken_sub_handler.process_subtitle_files(files)
-    kanken_sub_handler.print_kanji_summary(nbr_of_allowed_existing_cards=0)
-    kanken_sub_handler.print_progress()
+    kanken_sub_handler.print_duplicates()
+
+    with _run_stats.stage('report'):
+        kanken_sub_handler.print_kanji_summary(nbr_of_allowed_existing_cards=0, pdf_split=args.pdf_split, max_workers=args.jobs)
+        kanken_sub_handler.print_vocabulary_summary()
+        kanken_sub_handler.print_progress()
+
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"\nプロファイルを {args.profile} に保存しました（python -m pstats {args.profile} で確認できます）。")
+
+    parse_failures = _run_stats.counters['parse_failures']
+    if parse_failures and not args.stats:
+        print(f"\n⚠️  読み込みに失敗した字幕ファイル: {parse_failures}件（--stats で詳細を表示します）")
+    if args.stats:
+        _run_stats.print_report()
+    if args.stats_json:
+        _run_stats.dump_json(args.stats_json)
 
     if not words:
         print("\n" + "=" * 50)
@@ -428,6 +2680,19 @@ def main():
 
     FileUtils.save_args_to_file(args)
 
+    if args.watch:
+        watcher = SubtitleWatcher(kanken_sub_handler, args.target, extensions, interval=args.interval, max_workers=args.jobs, anki_loader=load_anki_kanji_occurrences, pdf_split=args.pdf_split)
+        watcher.start(files)
+        watcher.run()
+
+    if scan_cache is not None:
+        scan_cache.close()
+    if kanji_index is not None:
+        kanji_index.close()
+
+    if args.profile_startup:
+        print_startup_profile()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""疑似AnkiConnectサーバーを使った AnkiHandler（同期・差分同期・再接続・オフライン）のテスト。"""
+
+import os
+import socket
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from fake_anki import FIRST_NOTE_ID, FakeAnkiConnect  # noqa: E402
+from kankensub import AnkiHandler  # noqa: E402
+
+DECK = 'Bench'
+WORD_FIELD = 'Word'
+
+
+@pytest.fixture
+def fake():
+    with FakeAnkiConnect(notes=50, word_field=WORD_FIELD, edited_fraction=0) as server:
+        # notesInfo で取得されたノートIDを記録する
+        server.fetched_ids = []
+        invoke = server._invoke
+
+        def recording_invoke(action, params):
+            if action == 'notesInfo':
+                server.fetched_ids.extend(params.get('notes', []))
+            return invoke(action, params)
+
+        server._invoke = recording_invoke
+        yield server
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / 'anki_cache.json')
+
+
+def unused_url():
+    # 接続を受け付けるサーバーがいないURL
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def expected_words(fake):
+    return sorted(fake.words[note_id - FIRST_NOTE_ID] + '\n' for note_id in fake.note_ids)
+
+
+def test_full_sync(fake, cache_file):
+    words = AnkiHandler(fake.url, cache_file=cache_file).get_words_in_deck(DECK, WORD_FIELD)
+    assert sorted(words) == expected_words(fake)
+    assert sorted(fake.fetched_ids) == sorted(fake.note_ids)
+    assert os.path.exists(cache_file)
+
+
+def test_incremental_sync(fake, cache_file):
+    AnkiHandler(fake.url, cache_file=cache_file).get_words_in_deck(DECK, WORD_FIELD)
+
+    # 1件を編集し、1件を追加し、1件を削除する
+    changed_id, removed_id = fake.note_ids[3], fake.note_ids[7]
+    fake.words[changed_id - FIRST_NOTE_ID] = '蒼穹'
+    fake.words.append('嘩')
+    new_id = FIRST_NOTE_ID + len(fake.words) - 1
+    fake.note_ids = [note_id for note_id in fake.note_ids if note_id != removed_id] + [new_id]
+    fake.edited_ids = [changed_id]
+    fake.fetched_ids.clear()
+
+    words = AnkiHandler(fake.url, cache_file=cache_file).get_words_in_deck(DECK, WORD_FIELD)
+    assert sorted(words) == expected_words(fake)
+    assert '蒼穹\n' in words and '嘩\n' in words
+    # 編集されたノートと新しいノートだけを取得する
+    assert sorted(fake.fetched_ids) == sorted([changed_id, new_id])
+
+
+def test_reconnects_dropped_keep_alive_connection(fake, cache_file):
+    handler = AnkiHandler(fake.url, cache_file=cache_file)
+    assert handler._invoke('version') == 6
+    connection = handler._connection
+    assert connection is not None
+
+    # サーバー側でkeep-alive接続が切れた状態にする
+    connection.sock.shutdown(socket.SHUT_RDWR)
+    requests = fake.requests
+    assert handler._invoke('version') == 6
+    assert handler._connection is not connection
+    assert fake.requests == requests + 1
+    handler.close()
+
+
+def test_offline_fallback_uses_cache(fake, cache_file):
+    words = AnkiHandler(fake.url, cache_file=cache_file).get_words_in_deck(DECK, WORD_FIELD)
+
+    # Ankiに接続できない場合と --offline の場合は、前回取得した単語を使う
+    assert sorted(AnkiHandler(unused_url(), cache_file=cache_file).get_words_in_deck(DECK, WORD_FIELD)) == sorted(words)
+    assert sorted(AnkiHandler(fake.url, cache_file=cache_file, offline=True).get_words_in_deck(DECK, WORD_FIELD)) == sorted(words)
+
+
+def test_offline_fallback_without_cache(cache_file):
+    # --offline でキャッシュがなければ単語なし、Ankiに接続できずキャッシュもなければ終了する
+    assert AnkiHandler(unused_url(), cache_file=cache_file, offline=True).get_words_in_deck(DECK, WORD_FIELD) == []
+    with pytest.raises(SystemExit):
+        AnkiHandler(unused_url(), cache_file=cache_file).get_words_in_deck(DECK, WORD_FIELD)
+    assert not os.path.exists(cache_file)
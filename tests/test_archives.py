@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""zip・tarの中の字幕（「アーカイブ!メンバー」形式のパス）の探索と読み込みのテスト。"""
+
+import os
+import sys
+import tarfile
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from corpus import generate_corpus  # noqa: E402
+from kankensub import ArchiveUtils, FileUtils, KanjiUtils, KankenSubtitleProcessor, _run_stats  # noqa: E402
+
+
+@pytest.fixture
+def library(tmp_path):
+    # 展開済みの字幕と、同じ字幕を入れたzip・tar.gz、壊れたアーカイブを置いたフォルダ
+    source = generate_corpus(str(tmp_path / 'source'), files=4, lines_per_file=40)
+    directory = tmp_path / 'library'
+    directory.mkdir()
+
+    zip_path = str(directory / 'Show.zip')
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('S1/', '')
+        zf.write(source[0], 'S1/' + os.path.basename(source[0]))
+        zf.write(source[1], os.path.basename(source[1]))
+        zf.writestr('readme.txt', '字幕ではない')
+
+    tar_path = str(directory / 'Other.tar.gz')
+    with tarfile.open(tar_path, 'w:gz') as tf:
+        tf.add(source[2], 'S2/' + os.path.basename(source[2]))
+        tf.add(source[3], os.path.basename(source[3]))
+
+    (directory / 'broken.zip').write_bytes(b'not a zip file')
+
+    members = {
+        ArchiveUtils.join(zip_path, 'S1/' + os.path.basename(source[0])): source[0],
+        ArchiveUtils.join(zip_path, os.path.basename(source[1])): source[1],
+        ArchiveUtils.join(tar_path, 'S2/' + os.path.basename(source[2])): source[2],
+        ArchiveUtils.join(tar_path, os.path.basename(source[3])): source[3],
+    }
+    return str(directory), members
+
+
+def counts(files, stream):
+    processor = KankenSubtitleProcessor(*KanjiUtils.load_kanken_kanji_sets(), {}, max_examples=None, stream=stream, dedupe=False)
+    processor.process_subtitle_files(files, max_workers=1)
+    return {kanji: processor.occurrences.count(kanji) for kanji in processor.occurrences}
+
+
+def test_split_and_join():
+    assert ArchiveUtils.split('/subs/Show.zip!S1/ep1.srt') == ('/subs/Show.zip', 'S1/ep1.srt')
+    assert ArchiveUtils.split('/subs/Other.tar.gz!ep!2.srt') == ('/subs/Other.tar.gz', 'ep!2.srt')
+    # アーカイブでない部分の "!" は区切りとみなさない
+    assert ArchiveUtils.split('/subs/Wow!/ep1.srt') == ('/subs/Wow!/ep1.srt', None)
+    assert ArchiveUtils.split('/subs/Wow!/Show.zip!ep1.srt') == ('/subs/Wow!/Show.zip', 'ep1.srt')
+    assert ArchiveUtils.split(ArchiveUtils.join('/subs/Show.7z', 'ep1.ass')) == ('/subs/Show.7z', 'ep1.ass')
+
+
+def test_discovers_members(library):
+    directory, members = library
+    _run_stats.reset()
+    found = set(FileUtils.iter_files(directory, FileUtils.SUBTITLE_EXTENSIONS))
+    assert found == set(members)
+    # 壊れたアーカイブは読み込み失敗として記録し、探索は続ける
+    assert [file for file, _ in _run_stats.failures] == [os.path.join(directory, 'broken.zip')]
+
+    # アーカイブを直接指定した場合もメンバーを返す
+    zip_path = os.path.join(directory, 'Show.zip')
+    assert set(FileUtils.iter_files(zip_path, FileUtils.SUBTITLE_EXTENSIONS)) == {member for member in members if member.startswith(zip_path)}
+
+
+def test_member_metadata(library):
+    _, members = library
+    for member, source in members.items():
+        assert FileUtils.stat(member)[1] == os.path.getsize(source)
+        assert FileUtils.basename(member) == os.path.basename(source)
+        with FileUtils.open_binary(member) as f, open(source, 'rb') as expected:
+            assert f.read() == expected.read()
+    assert not FileUtils.exists(ArchiveUtils.join(ArchiveUtils.split(next(iter(members)))[0], 'missing.srt'))
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_scan_matches_extracted_files(library, stream):
+    # メンバーを展開せずに読んだ結果が、展開済みのファイルを読んだ結果と一致する
+    _, members = library
+    result = counts(sorted(members), stream)
+    assert result and result == counts(sorted(members.values()), stream)
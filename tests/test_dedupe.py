@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""重複した字幕（同一内容・ほぼ同じテキスト）の検出と、元のファイルを削除したときの処理し直しのテスト。"""
+
+import os
+import random
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from corpus import make_line, write_subtitle  # noqa: E402
+from kankensub import KanjiUtils, KankenSubtitleProcessor, SubtitleDeduplicator  # noqa: E402
+
+KANKEN = "".join(KanjiUtils.kanken_kanji_data.values())
+
+
+def make_texts(seed, lines=60):
+    rng = random.Random(seed)
+    return [make_line(rng, KANKEN, density=0.2) for _ in range(lines)]
+
+
+def fingerprint(texts):
+    return SubtitleDeduplicator.fingerprint(texts)
+
+
+def make_processor():
+    return KankenSubtitleProcessor(*KanjiUtils.load_kanken_kanji_sets(), {}, max_examples=None)
+
+
+def summarize(processor):
+    occurrences = processor.occurrences
+    return {
+        kanji: (occurrences.count(kanji), sorted((start, text) for _, start, text in occurrences.examples(kanji)))
+        for kanji in occurrences
+    }
+
+
+def fresh_scan(files):
+    processor = make_processor()
+    processor.process_subtitle_files(files, max_workers=1)
+    return summarize(processor)
+
+
+def root(duplicates, file):
+    # 重複をたどって、最終的に残したファイルを返す
+    while file in duplicates:
+        file = duplicates[file][0]
+    return file
+
+
+def test_byte_duplicates(tmp_path):
+    original = str(tmp_path / 'Show.E01.srt')
+    write_subtitle(original, make_texts(1))
+    copy = str(tmp_path / 'Other.Group.Show.E01.srt')
+    shutil.copy(original, copy)
+    # 同じサイズで内容が違うファイルは重複ではない
+    same_size = str(tmp_path / 'Show.E02.srt')
+    with open(original, 'rb') as f:
+        data = bytearray(f.read())
+    data[-3] ^= 1
+    with open(same_size, 'wb') as f:
+        f.write(data)
+
+    deduplicator = SubtitleDeduplicator()
+    assert not deduplicator.check_bytes(original)
+    # サイズが同じファイルが現れるまでハッシュは計算しない
+    assert original in deduplicator.unhashed_sizes and not deduplicator.file_digests
+    assert deduplicator.check_bytes(copy)
+    assert not deduplicator.check_bytes(same_size)
+    assert deduplicator.duplicates == {copy: (original, None)}
+
+
+def test_near_duplicates():
+    texts = make_texts(1)
+    deduplicator = SubtitleDeduplicator()
+    assert not deduplicator.check_text('Show.E01.srt', fingerprint(texts))
+
+    # 書式タグ・改行・行の順序が違っても、ほぼ同じテキストなら重複
+    retimed = ["{\\i1}" + text[:10] + "\\N" + text[10:] for text in reversed(texts)]
+    assert deduplicator.check_text('Show.E01.ass', fingerprint(retimed))
+    # v2（数行だけ修正）も重複
+    assert deduplicator.check_text('Show.E01v2.srt', fingerprint(texts[:-2] + make_texts(2, lines=2)))
+    # 別のエピソードは重複ではない
+    assert not deduplicator.check_text('Show.E02.srt', fingerprint(make_texts(3)))
+    # 行の種類が少ないファイルはテキストで比較しない
+    assert not deduplicator.check_text('Short.srt', fingerprint(texts[:SubtitleDeduplicator.MIN_LINES - 1]))
+
+    assert set(deduplicator.duplicates) == {'Show.E01.ass', 'Show.E01v2.srt'}
+    assert deduplicator.duplicates['Show.E01.ass'][0] == 'Show.E01.srt'
+
+
+def test_similarity_estimates_jaccard():
+    # 指紋から推定した一致率が、行の集合のJaccard係数に近い
+    texts = make_texts(1, lines=1000)
+    for shared in (1000, 900, 500, 0):
+        other = texts[:shared] + make_texts(2, lines=1000 - shared)
+        jaccard = shared / (2000 - shared)
+        assert abs(SubtitleDeduplicator.similarity(fingerprint(texts), fingerprint(other)) - jaccard) < 0.15
+
+
+def test_forget_revives_duplicates(tmp_path):
+    original = str(tmp_path / 'Show.E01.srt')
+    texts = make_texts(1)
+    write_subtitle(original, texts)
+    copy = str(tmp_path / 'Other.Group.Show.E01.srt')
+    shutil.copy(original, copy)
+    ass = str(tmp_path / 'Show.E01.ass')
+    write_subtitle(ass, texts)
+    other = str(tmp_path / 'Show.E02.srt')
+    write_subtitle(other, make_texts(3))
+    files = [original, copy, ass, other]
+
+    processor = make_processor()
+    processor.process_subtitle_files(files, max_workers=1)
+    duplicates = processor.deduplicator.duplicates
+    # 同じエピソードの3つのうち、どれを残すかは処理順による。同一内容のファイルは、.assの重複としてスキップした.srtの重複になることもある
+    episode = {original, copy, ass}
+    [kept] = episode - set(duplicates)
+    assert set(duplicates) == episode - {kept}
+    assert all(root(duplicates, file) == kept for file in duplicates)
+    assert summarize(processor) == fresh_scan([kept, other])
+
+    # 残したファイルを削除すると、重複としてスキップしていたファイルを処理し直す（そのうち1つが残り、もう1つはその重複になる）
+    os.remove(kept)
+    processor.remove_subtitle_files([kept])
+    remaining = sorted(episode - {kept})
+    assert kept not in processor.deduplicator
+    assert len(duplicates) == 1 and set(duplicates) < set(remaining)
+    assert summarize(processor) == fresh_scan(remaining + [other])
+
+    # 残ったファイルとその重複を一緒に削除した場合は、どちらも処理し直さない
+    for file in remaining:
+        os.remove(file)
+    assert processor.deduplicator.forget(remaining) == []
+    for file in remaining:
+        assert file not in processor.deduplicator
+    assert not processor.deduplicator.duplicates and not processor.deduplicator.duplicates_of.get(remaining[0])
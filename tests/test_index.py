@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""漢字インデックス（KanjiIndex）の追加・削除・prune と、query サブコマンドの出力のテスト。"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from corpus import write_subtitle  # noqa: E402
+from kankensub import FileUtils, KanjiIndex, KanjiUtils, KankenSubtitleProcessor, query_main  # noqa: E402
+
+SUBTITLES = {
+    'ShowA/Show.A.E01.srt': ["蒼穹の彼方", "蒼い空と嘩", "普通の行"],
+    'ShowA/Show.A.E02.srt': ["蒼蒼", "游ぐ"],
+    'ShowB/Show.B.E01.srt': ["朧月夜", "蒼"],
+}
+
+
+@pytest.fixture
+def library(tmp_path):
+    files = []
+    for name, texts in SUBTITLES.items():
+        path = tmp_path / 'subs' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_subtitle(str(path), texts)
+        files.append(str(path))
+    return files
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = KanjiIndex(str(tmp_path / 'index.sqlite3'))
+    yield index
+    index.close()
+
+
+def scan(files, index):
+    processor = KankenSubtitleProcessor(*KanjiUtils.load_kanken_kanji_sets(), {}, max_examples=None, index=index)
+    processor.process_subtitle_files(files, max_workers=1)
+    index.commit()
+    return processor
+
+
+def kanji_counts(index):
+    return {kanji: count for kanji, _, count, _ in index.top(k=1000)}
+
+
+def assert_stats_consistent(index):
+    # 差分で更新した集計テーブルが、出現箇所から数え直した結果と一致する
+    conn = index.conn
+    postings = "FROM postings p JOIN lines l ON p.line_id = l.id JOIN files f ON l.file_id = f.id"
+    assert dict(conn.execute(f"SELECT p.kanji, SUM(p.count) {postings} GROUP BY p.kanji")) == dict(conn.execute("SELECT kanji, count FROM kanji_stats"))
+    assert sorted(conn.execute(f"SELECT p.kanji, f.series, SUM(p.count) {postings} GROUP BY p.kanji, f.series")) == sorted(conn.execute("SELECT kanji, series, count FROM series_stats"))
+
+
+def test_scan_fills_index(library, index):
+    processor = scan(library, index)
+    assert kanji_counts(index) == {kanji: processor.occurrences.count(kanji) for kanji in processor.occurrences}
+    assert kanji_counts(index) == {'蒼': 5, '穹': 1, '嘩': 1, '游': 1, '朧': 1}
+    assert_stats_consistent(index)
+
+    result = index.lookup('蒼', limit=3)
+    series_a, series_b = FileUtils.series_name(library[0]), FileUtils.series_name(library[2])
+    assert result['count'] == 5 and result['level'] == KanjiUtils.get_kanken_level('蒼')
+    assert result['series'] == [(series_a, 4), (series_b, 1)]
+    assert len(result['examples']) == 3
+    assert index.lookup('鬱') is None
+
+
+def test_add_and_remove_files(library, index):
+    scan(library, index)
+
+    # 同じファイルを書き込み直しても二重に数えない
+    index.add_file(library[1], [(0, "蒼蒼"), (3000, "游ぐ")])
+    assert kanji_counts(index)['蒼'] == 5
+    # 内容の変わったファイルは置き換える
+    index.add_file(library[1], [(0, "贅沢")])
+    assert kanji_counts(index) == {'蒼': 3, '穹': 1, '嘩': 1, '朧': 1, '贅': 1}
+    assert_stats_consistent(index)
+
+    # 削除すると、出現回数が0になった漢字も集計から消える
+    index.remove_file(library[2])
+    assert kanji_counts(index) == {'蒼': 2, '穹': 1, '嘩': 1, '贅': 1}
+    assert index.lookup('蒼')['series'] == [(FileUtils.series_name(library[0]), 2)]
+    assert_stats_consistent(index)
+    assert not index.is_current(library[2])
+
+
+def test_prune_removes_deleted_files(library, index):
+    scan(library, index)
+    assert all(index.is_current(file) for file in library)
+
+    os.remove(library[0])
+    assert index.prune() == 1
+    assert kanji_counts(index) == {'蒼': 3, '游': 1, '朧': 1}
+    assert_stats_consistent(index)
+    assert index.prune() == 0
+
+
+def test_query_output(library, index, capsys):
+    scan(library, index)
+    index.set_anki_counts({'蒼': 2, '朧': 0})
+    index.commit()
+    capsys.readouterr()
+
+    query_main(['蒼鬱', '--limit', '2', '--index', index.path])
+    lines = capsys.readouterr().out.splitlines()
+    level = KanjiUtils.LEVEL_NAMES[KanjiUtils.get_kanken_level('蒼')]
+    assert lines[0] == f"漢字: 蒼, レベル: {level}, Ankiカード数: 2枚, 出現回数: 5回"
+    assert lines[1] == f"シリーズ: {FileUtils.series_name(library[0])} (4回)、{FileUtils.series_name(library[2])} (1回)"
+    assert lines[2] == "出現箇所:"
+    assert len([line for line in lines[3:] if ' - ' in line]) == 2
+    assert "漢字: 鬱, 漢検準一級・一級の漢字ではないため検索できません" in lines
+    assert lines[-1].startswith("検索時間: ")
+
+    # Ankiにない漢字の上位（同数なら漢字順）
+    query_main(['--top', '2', '--not-in-anki', '--index', index.path])
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split(',')[0] for line in lines[:2]] == ["   1. 漢字: 嘩", "   2. 漢字: 朧"]
+
+
+def test_query_without_index(tmp_path):
+    with pytest.raises(SystemExit):
+        query_main(['蒼', '--index', str(tmp_path / 'missing.sqlite3')])
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""ストリーミングモードのトークナイザー（SubtitleTokenizer）が、pysubs2で読んだ結果と一致するかのテスト。"""
+
+import os
+import sys
+
+import pysubs2
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from corpus import ASS_HEADER, generate_corpus  # noqa: E402
+from kankensub import KanjiUtils, ScanCache, SubtitleTokenizer  # noqa: E402
+
+SRT = (
+    "1\n"
+    "00:00:01,500 --> 00:00:03,000\n"
+    "<i>蒼穹</i>の彼方\n"
+    "二行目の<font color=\"red\">嘩</font>\n"
+    "\n"
+    "2\n"
+    "00:00:04,000 --> 00:00:05,000\n"
+    "游ぐ\n"
+    # 空行なしで次の字幕が始まる
+    "3\n"
+    "00:01:06,050 --> 00:01:07,000\n"
+    "朧月夜\n"
+)
+
+VTT = (
+    "WEBVTT\n"
+    "\n"
+    "NOTE 蒼穹（コメントは字幕ではない）\n"
+    "\n"
+    "STYLE\n"
+    "::cue { color: white }\n"
+    "\n"
+    "00:01.500 --> 00:03.000\n"
+    "蒼穹の<b>彼方</b>\n"
+    "\n"
+    "01:00:04.000 --> 01:00:05.000 align:start position:10%\n"
+    "游ぐ\n"
+    "贅沢\n"
+)
+
+ASS = ASS_HEADER + (
+    "Dialogue: 0,0:00:01.50,0:00:03.00,Default,,0,0,0,,{\\i1}蒼穹{\\i0}の,彼方\\N嘩\n"
+    "Comment: 0,0:00:02.00,0:00:03.00,Default,,0,0,0,,朧\n"
+    "Dialogue: 0,0:01:02.05,0:01:03.00,Default,,0,0,0,,{\\fn游ゴシック}游ぐ\n"
+)
+
+
+def pysubs2_lines(path):
+    return [(line.start, line.text) for line in pysubs2.load(path)]
+
+
+def tokenizer_lines(path):
+    return list(SubtitleTokenizer.iter_lines(path))
+
+
+def normalized(lines):
+    # pysubs2はSRTのHTMLタグをASSの上書きタグに変換するので、書式タグを除いたテキストで比べる
+    return [(start, KanjiUtils.normalize_text(text)) for start, text in lines]
+
+
+def write(path, content, encoding='utf-8'):
+    with open(path, 'w', encoding=encoding) as f:
+        f.write(content)
+    return str(path)
+
+
+@pytest.mark.parametrize('name, content, encoding', [('sample.srt', SRT, 'utf-8-sig'), ('sample.vtt', VTT, 'utf-8')])
+def test_srt_and_vtt_match_pysubs2(tmp_path, name, content, encoding):
+    path = write(tmp_path / name, content, encoding=encoding)
+    assert normalized(tokenizer_lines(path)) == normalized(pysubs2_lines(path))
+
+
+def test_vtt_cue_identifiers_and_bom(tmp_path):
+    # pysubs2はキューIDを前の字幕のテキストに含め、BOM付きのファイルでは最初のキューを落とすので、期待値と直接比べる
+    content = VTT.replace("01:00:04.000", "cue-2\n01:00:04.000")
+    path = write(tmp_path / 'sample.vtt', content, encoding='utf-8-sig')
+    assert tokenizer_lines(path) == [(1500, '蒼穹の彼方'), (3604000, '游ぐ\\N贅沢')]
+
+
+def test_ass_matches_pysubs2(tmp_path):
+    # ASSのテキストはpysubs2と同じくタグも含めてそのまま返す（テキスト中のカンマ、コメント行も含む）
+    path = write(tmp_path / 'sample.ass', ASS, encoding='utf-8-sig')
+    assert tokenizer_lines(path) == pysubs2_lines(path)
+
+
+def test_generated_corpus_matches_pysubs2(tmp_path):
+    for path in generate_corpus(str(tmp_path), files=4, lines_per_file=80, tag_rate=0.5):
+        tokens = tokenizer_lines(path)
+        assert len(tokens) == 80
+        assert normalized(tokens) == normalized(pysubs2_lines(path))
+        # 漢検漢字の判定結果も一致する
+        assert [KanjiUtils.extract_kanken_kanji(text) for _, text in tokens] == [
+            KanjiUtils.extract_kanken_kanji(text) for _, text in pysubs2_lines(path)
+        ]
+
+
+@pytest.mark.parametrize('fraction, ms', [('5', 500), ('50', 500), ('500', 500), ('05', 50), ('5009', 500)])
+def test_fraction_digits(fraction, ms):
+    # 小数部の桁数によらずミリ秒に揃える
+    assert SubtitleTokenizer._to_ms('0', '0', '1', fraction) == 1000 + ms
+
+
+def test_digest_covers_whole_file(tmp_path):
+    # 最後まで読むと、ファイル内容のハッシュが ScanCache.file_digest と一致する
+    path = write(tmp_path / 'sample.srt', SRT * 200, encoding='utf-8-sig')
+    digest = ScanCache.new_digest()
+    assert len(list(SubtitleTokenizer.iter_lines(path, digest))) == 3 * 200
+    assert digest.hexdigest() == ScanCache.file_digest(path)
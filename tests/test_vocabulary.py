@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""語彙照合のAho-Corasickオートマトン（VocabularyMatcher）が、素朴な検索と同じ結果を返すかのテスト。"""
+
+import os
+import random
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from bench_vocab import make_lines, make_words  # noqa: E402
+from kankensub import KanjiUtils, VocabularyMatcher  # noqa: E402
+
+
+def naive_find(text, words):
+    # 単語ごとに、重なりも含めてすべての出現位置を数える
+    text = KanjiUtils.normalize_text(text)
+    return Counter({
+        word: count for word in words
+        if (count := sum(1 for position in range(len(text)) if text.startswith(word, position)))
+    })
+
+
+def test_matches_naive_search_with_overlaps():
+    # 少ない文字種で、重なり・包含・接尾辞が一致する単語を多く作る
+    rng = random.Random(0)
+    alphabet = "蒼穹嘩游"
+    words = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(40)}
+    matcher = VocabularyMatcher(sorted(words))
+    for _ in range(300):
+        text = "".join(rng.choice(alphabet + "のは") for _ in range(rng.randint(0, 30)))
+        assert Counter(matcher.find_words(text)) == naive_find(text, matcher.words), text
+
+
+def test_matches_naive_search_on_generated_lines():
+    matcher = VocabularyMatcher(make_words(300))
+    lines = make_lines(500, matcher.words)
+    hits = 0
+    for text in lines:
+        found = Counter(matcher.find_words(text))
+        assert found == naive_find(text, matcher.words), text
+        hits += sum(found.values())
+    assert hits > 0
+
+
+def test_occurrence_order_and_normalization():
+    matcher = VocabularyMatcher(["蒼穹", "穹", "ＡＢ", "", "蒼穹"])
+    # 単語も正規化し、空の単語と重複は除く
+    assert matcher.words == ["蒼穹", "穹", "AB"]
+    # 出現（の終わり）の順に返し、書式タグ・改行・記号・全角半角の違いは無視する
+    assert matcher.find_words("{\\i1}蒼\\N穹、穹…ＡＢ!") == ["蒼穹", "穹", "穹", "AB"]
+    assert matcher.find_words("関係ない行") == []
+
+
+def test_read_words(tmp_path):
+    path = tmp_path / 'vocab.tsv'
+    path.write_text("# コメント\n蒼穹\t読み\n\n嘩, かまびすしい\n  游弋  \n", encoding='utf-8-sig')
+    assert VocabularyMatcher.read_words(str(path)) == ["蒼穹", "嘩", "游弋"]
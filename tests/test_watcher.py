@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""監視モード（SubtitleWatcher）の差分処理が、最初からスキャンし直した結果と一致するかのテスト。"""
+
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from corpus import generate_corpus, write_subtitle  # noqa: E402
+from kankensub import FileUtils, KanjiUtils, KankenSubtitleProcessor, SubtitleWatcher  # noqa: E402
+
+
+def make_processor():
+    # 用例の上限をなくし、処理順によらずすべての出現箇所を比較できるようにする
+    return KankenSubtitleProcessor(*KanjiUtils.load_kanken_kanji_sets(), {}, max_examples=None)
+
+
+def summarize(processor):
+    # 漢字ごとの (出現回数, 出現箇所の (開始時刻, テキスト))。重複のどのファイルを残したかには依存しない
+    occurrences = processor.occurrences
+    return {
+        kanji: (occurrences.count(kanji), sorted((start, text) for _, start, text in occurrences.examples(kanji)))
+        for kanji in occurrences
+    }
+
+
+def fresh_scan(directory):
+    processor = make_processor()
+    processor.process_subtitle_files(FileUtils.get_files(directory, FileUtils.SUBTITLE_EXTENSIONS), max_workers=1)
+    return summarize(processor)
+
+
+def touch_later(path):
+    # mtimeの分解能が粗いファイルシステムでも変更として検出されるよう、mtimeを進める
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def test_poll_matches_fresh_scan(tmp_path):
+    directory = str(tmp_path / 'subs')
+    files = generate_corpus(directory, files=6, lines_per_file=60)
+
+    processor = make_processor()
+    processor.process_subtitle_files(FileUtils.get_files(directory, FileUtils.SUBTITLE_EXTENSIONS), max_workers=1)
+    watcher = SubtitleWatcher(processor, directory, FileUtils.SUBTITLE_EXTENSIONS, max_workers=1)
+    watcher.start()
+    assert summarize(processor) == fresh_scan(directory)
+
+    # 同じ内容のファイル（別のリリース）を追加しても出現回数は増えない
+    original = files[0]
+    duplicate = os.path.join(directory, 'Other.Group.' + os.path.basename(original))
+    shutil.copy(original, duplicate)
+    before = summarize(processor)
+    watcher.poll()
+    assert duplicate in processor.deduplicator.duplicates
+    assert summarize(processor) == before == fresh_scan(directory)
+
+    # 元のファイルを削除すると、重複としてスキップしていたファイルが代わりに集計される
+    os.remove(original)
+    watcher.poll()
+    assert duplicate not in processor.deduplicator.duplicates
+    assert summarize(processor) == fresh_scan(directory)
+
+    # 変更されたファイルは古い結果を置き換える
+    write_subtitle(files[1], ["蒼穹の彼方へ", "嘩しい朝だ"] * 30)
+    touch_later(files[1])
+    watcher.poll()
+    assert summarize(processor) == fresh_scan(directory)
+
+    # 変更がなければ何もしない
+    assert watcher.poll() == set()
+    assert summarize(processor) == fresh_scan(directory)